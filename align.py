@@ -0,0 +1,129 @@
+import re
+
+import numpy as np
+
+import encoding
+
+# alignment operations, as stored in the traceback matrix
+_DIAG, _UP, _LEFT = 0, 1, 2
+
+
+def banded_align(read, windows, band, match=1, mismatch=-1, gap=-2):
+    """
+    Align a read against several reference windows at once, within a band
+    around their diagonal
+
+    The read is aligned end to end while the window ends are free
+    (semi-global alignment). Band column b of row i stands for window column
+    i + b, b spanning [0, 2 * band]. Each row is computed for all windows and
+    band columns at once, the left dependency of linear gaps being solved by
+    a running maximum.
+
+    Parameters
+    ----------
+    read : np.array
+        codes of the read, of length m
+    windows : np.array
+        codes of the reference windows, of shape (w, m + 2 * band)
+    band : int
+        band half-width
+    match : int
+        score of a match
+    mismatch : int
+        score of a mismatch, N never matching
+    gap : int
+        score of an insertion or a deletion, per base
+
+    Returns
+    -------
+    np.array
+        best score of each window
+    np.array
+        band column where the best alignment of each window ends
+    np.array
+        (m, w, 2 * band + 1) traceback matrix
+    """
+    m = len(read)
+    width = 2 * band + 1
+    n_windows = len(windows)
+    cols = np.arange(width)
+    # weights turning the left dependency into a running maximum
+    ramp = -gap * cols
+
+    H = np.zeros((n_windows, width), dtype=np.int64)
+    trace = np.empty((m, n_windows, width), dtype=np.int8)
+    low = np.iinfo(np.int64).min // 4
+    for i in range(m):
+        ref = windows[:, i : i + width]
+        hit = (ref == read[i]) & (read[i] != encoding.N_CODE)
+        diag = H + np.where(hit, match, mismatch)
+        up = np.full_like(H, low)
+        up[:, :-1] = H[:, 1:] + gap
+        best = np.maximum(diag, up)
+        row = np.maximum.accumulate(best + ramp, axis=1) - ramp
+        trace[i] = np.where(row == diag, _DIAG, np.where(row == up, _UP, _LEFT))
+        H = row
+    end = H.argmax(axis=1)
+    return H[np.arange(n_windows), end], end, trace
+
+
+def traceback(trace, window, end):
+    """
+    Recover the CIGAR string and start of the best alignment of a window
+
+    Parameters
+    ----------
+    trace : np.array
+        traceback matrix returned by banded_align
+    window : int
+        index of the window
+    end : int
+        band column where the alignment ends
+
+    Returns
+    -------
+    int
+        window column where the alignment starts
+    str
+        CIGAR string, M for matches and mismatches, I for insertions in the
+        read and D for deletions from the read
+    """
+    ops = []
+    i, b = len(trace), end
+    while i > 0:
+        op = trace[i - 1, window, b]
+        if op == _DIAG:
+            ops.append("M")
+            i -= 1
+        elif op == _UP:
+            ops.append("I")
+            i -= 1
+            b += 1
+        else:
+            ops.append("D")
+            b -= 1
+    ops.reverse()
+    cigar = []
+    for op in ops:
+        if cigar and cigar[-1][1] == op:
+            cigar[-1][0] += 1
+        else:
+            cigar.append([1, op])
+    return b, "".join(f"{n}{op}" for n, op in cigar)
+
+
+def reference_span(cigar):
+    """
+    Number of reference bases covered by an alignment
+
+    Parameters
+    ----------
+    cigar : str
+        CIGAR string
+
+    Returns
+    -------
+    int
+        number of matched, mismatched and deleted bases
+    """
+    return sum(int(n) for n, op in re.findall(r"(\d+)([MD])", cigar))
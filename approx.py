@@ -0,0 +1,195 @@
+import bisect
+
+import numpy as np
+
+import isbwt
+from fmindex import FMIndex
+
+# no insertion or deletion within this many bases of either pattern end,
+# where it would only shift an alignment found without it
+INDEL_END_SKIP = 5
+
+
+def reverse_index(seq, preset="balanced"):
+    """
+    Build the FM-index of the reversed reference, used to bound the search
+
+    Parameters
+    ----------
+    seq : str
+        reference sequence
+    preset : str
+        sampling rates and rank structure, one of fmindex.PRESETS
+
+    Returns
+    -------
+    FMIndex
+        index of the reversed sequence
+    """
+    return FMIndex.from_transform(isbwt.isbwt(seq[::-1]), preset)
+
+
+def encode(index, pattern):
+    """
+    Encode a pattern, characters outside of the alphabet getting code -1
+
+    Parameters
+    ----------
+    index : FMIndex
+        index whose alphabet is used
+    pattern : str
+        pattern to encode
+
+    Returns
+    -------
+    list
+        codes of the pattern
+    """
+    return [index.code.get(c, -1) for c in pattern]
+
+
+def lower_bounds(reverse, codes):
+    """
+    Calculate the D array: D[i] is a lower bound on the number of
+    differences between pattern[:i + 1] and any substring of the reference
+
+    pattern[j:i + 1] occurs in the reference if and only if its reverse
+    occurs in the reversed reference, which a backward search of the reverse
+    index checks while extending i. Every time the interval becomes empty,
+    one more difference is needed and the search restarts after i.
+
+    Parameters
+    ----------
+    reverse : FMIndex
+        index of the reversed reference
+    codes : list
+        codes of the pattern
+
+    Returns
+    -------
+    list
+        lower bound for every prefix of the pattern
+    """
+    D = []
+    z = 0
+    sp, ep = 0, len(reverse)
+    for c in codes:
+        if c >= 0:
+            sp, ep = reverse.lf(c, sp), reverse.lf(c, ep)
+        if c < 0 or sp >= ep:
+            z += 1
+            sp, ep = 0, len(reverse)
+        D.append(z)
+    return D
+
+
+def search(index, pattern, k, reverse=None, edits=False):
+    """
+    Find the suffix array intervals matching the pattern with at most k
+    differences, by backtracking backward search
+
+    Branches are pruned as soon as the differences left cannot cover the
+    lower bound of the remaining prefix. Insertions and deletions are kept
+    INDEL_END_SKIP bases away from both pattern ends.
+
+    Parameters
+    ----------
+    index : FMIndex
+        index of the reference
+    pattern : str
+        pattern to search
+    k : int
+        maximum number of differences
+    reverse : FMIndex, optional
+        index of the reversed reference, no pruning is done without it
+    edits : bool
+        allow insertions and deletions on top of mismatches
+
+    Returns
+    -------
+    list
+        (sp, ep, differences, span) for every matching interval, span being
+        the number of reference characters matched, which insertions and
+        deletions make differ from the pattern length
+    """
+    codes = encode(index, pattern)
+    if reverse is not None:
+        D = lower_bounds(reverse, codes)
+    else:
+        D = [0] * len(codes)
+    # every code but the sentinel can substitute a pattern character
+    alphabet = [c for c in range(len(index.alphabet)) if index.alphabet[c] != "$"]
+    hits = []
+    m = len(codes)
+
+    def recurse(i, z, sp, ep, span):
+        if i < 0:
+            hits.append((sp, ep, k - z, span))
+            return
+        if z < D[i]:
+            return
+        indel = edits and z > 0
+        if indel and INDEL_END_SKIP <= i < m - INDEL_END_SKIP:
+            # insertion in the pattern: skip its character
+            recurse(i - 1, z - 1, sp, ep, span)
+        for c in alphabet:
+            nsp, nep = index.lf(c, sp), index.lf(c, ep)
+            if nsp >= nep:
+                continue
+            if indel and INDEL_END_SKIP <= i + 1 <= m - INDEL_END_SKIP:
+                # deletion from the pattern: consume a reference character
+                recurse(i, z - 1, nsp, nep, span + 1)
+            if c == codes[i]:
+                recurse(i - 1, z, nsp, nep, span + 1)
+            elif z > 0:
+                recurse(i - 1, z - 1, nsp, nep, span + 1)
+
+    recurse(m - 1, k, 0, len(index), 0)
+    return hits
+
+
+def locate(index, pattern, k, reverse=None, edits=False):
+    """
+    Locate the occurrences of the pattern with at most k differences
+
+    Parameters
+    ----------
+    index : FMIndex
+        index of the reference
+    pattern : str
+        pattern to locate
+    k : int
+        maximum number of differences
+    reverse : FMIndex, optional
+        index of the reversed reference, used for pruning
+    edits : bool
+        allow insertions and deletions on top of mismatches, hits within k
+        positions of one with fewer differences being dropped
+
+    Returns
+    -------
+    np.array
+        sorted start positions
+    np.array
+        smallest number of differences at each position
+    np.array
+        reference span of the alignment with the fewest differences at each
+        position
+    """
+    best = {}
+    for sp, ep, diffs, span in search(index, pattern, k, reverse, edits):
+        for row in range(sp, ep):
+            position = index.resolve(row)
+            best[position] = min((diffs, span), best.get(position, (diffs, span)))
+    if edits:
+        # an insertion and a deletion shift the same alignment by a few
+        # positions, only the one with the fewest differences is kept
+        kept = []
+        for position in sorted(best, key=lambda p: (best[p][0], p)):
+            j = bisect.bisect_left(kept, position - k)
+            if j == len(kept) or kept[j] > position + k:
+                bisect.insort(kept, position)
+        best = {p: best[p] for p in kept}
+    positions = np.array(sorted(best), dtype=np.int64)
+    found = np.array([best[p] for p in positions], dtype=np.int64).reshape(-1, 2)
+    return positions, found[:, 0], found[:, 1]
@@ -1,16 +1,20 @@
 import argparse
 import json
+import multiprocessing as mp
+import os
+import platform
+import resource
 import sys
 import time
-from random import choice
+import tracemalloc
 
 import numpy as np
-from memory_profiler import profile
 
 import bwt
 import bwts
 import isbwt
 import sabwt
+from fmindex import FMIndex
 
 
 parser = argparse.ArgumentParser()
@@ -40,6 +44,37 @@ parser.add_argument(
     help="number of repetitions for each sequence length",
 )
 
+parser.add_argument(
+    "-w",
+    "--warmup",
+    type=int,
+    default=2,
+    help="number of untimed warm-up repetitions",
+)
+
+parser.add_argument(
+    "-q",
+    "--queries",
+    type=int,
+    default=100,
+    help="number of patterns counted and located per repetition",
+)
+
+parser.add_argument(
+    "-l",
+    "--query-length",
+    type=int,
+    default=10,
+    help="length of the patterns",
+)
+
+parser.add_argument(
+    "--seed",
+    type=int,
+    default=0,
+    help="seed of the generated sequences and patterns",
+)
+
 parser.add_argument(
     "-r",
     "--runtime",
@@ -51,11 +86,17 @@ parser.add_argument(
     "-m",
     "--memory",
     action="store_true",
-    help="calculate and save memory profile",
+    help="measure the peak memory of each phase, in a separate run",
+)
+
+parser.add_argument(
+    "-o",
+    "--output",
+    help="JSON output file, defaults to a timestamped file in results/",
 )
 
 
-def generate_seq(n):
+def generate_seq(n, rng=None):
     """
     Generate a random DNA sequence of length n
 
@@ -63,49 +104,224 @@ def generate_seq(n):
     ----------
     n : int
         length of the sequence
+    rng : np.random.Generator, optional
+        random generator
 
     Returns
     -------
     str
         random DNA sequence
     """
-    return "".join(choice("ACGT") for _ in range(n))
+    rng = np.random.default_rng() if rng is None else rng
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+    return bases[rng.integers(0, 4, n)].tobytes().decode()
 
 
-def benchmark_transform(n, rep, f, mprofile):
+def generate_patterns(seq, k, length, rng):
     """
-    Benchmark the transform function of a BWT class
+    Draw patterns from a sequence, so that they occur at least once
 
     Parameters
     ----------
-    n : int
-        length of the sequence
-    rep : int
-        number of repetitions
-    f : function
-        transform function of a BWT class
-    mprofile : bool
-        whether to calculate memory profile
+    seq : str
+        sequence
+    k : int
+        number of patterns
+    length : int
+        length of the patterns, capped by the sequence length
+    rng : np.random.Generator
+        random generator
 
     Returns
     -------
     list
-        list of runtimes
+        patterns
+    """
+    length = min(length, len(seq))
+    starts = rng.integers(0, len(seq) - length + 1, k)
+    return [seq[i : i + length] for i in starts]
+
+
+def machine_metadata():
+    """
+    Describe the machine and software running the benchmark
+
+    Returns
+    -------
+    dict
+        platform, processor, Python and NumPy versions
+    """
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process so far
+
+    Returns
+    -------
+    int
+        size in bytes
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def phases(f, seq, patterns):
+    """
+    Run the phases of an algorithm on a sequence, one step at a time
+
+    Each step is a callable taking no argument, run in order, so that the
+    caller times or profiles each one alone. The FM-index used by count and
+    locate is built between steps, outside of any of them.
+
+    Parameters
+    ----------
+    f : class
+        BWT class
+    seq : str
+        sequence to transform
+    patterns : list
+        patterns to count and locate
+
+    Yields
+    ------
+    tuple
+        phase name and its step
+    """
+    state = {}
+
+    def construction():
+        b = f(seq)
+        b.transform()
+        state["b"] = b
+
+    yield "construction", construction
+    b = state["b"]
+    if hasattr(b, "inverse"):
+        yield "inverse", b.inverse
+    if len(getattr(b, "SA", [])) and hasattr(b, "alphabet"):
+        index = FMIndex.from_transform(b)
+        yield "count", lambda: [index.count(p) for p in patterns]
+        yield "locate", lambda: [index.locate(p) for p in patterns]
+
+
+def memory_profile(f, seq, patterns):
+    """
+    Measure the peak memory of each phase, in a process of its own
+
+    Run in a fresh child process, so that the peak resident set size only
+    covers this algorithm on top of the interpreter, and not the earlier
+    algorithms and lengths of the benchmark.
+
+    Parameters
+    ----------
+    f : class
+        BWT class
+    seq : str
+        sequence to transform
+    patterns : list
+        patterns to count and locate
+
+    Returns
+    -------
+    dict
+        peak traced allocations of each phase, in bytes, by name
+    int
+        peak resident set size of the process, in bytes
     """
+    peaks = {}
+    for name, step in phases(f, seq, patterns):
+        tracemalloc.start()
+        step()
+        _, peaks[name] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return peaks, peak_rss()
+
+
+def summarize(wall_ns, cpu_ns):
+    """
+    Summarize the timings of a phase, in ms
+
+    Parameters
+    ----------
+    wall_ns : list
+        wall-clock time of each repetition, in ns
+    cpu_ns : list
+        CPU time of each repetition, in ns
+
+    Returns
+    -------
+    dict
+        timepoints, median, mean and standard deviation of the wall-clock
+        times, and timepoints of the CPU times
+    """
+    wall = np.array(wall_ns) / 1e6
+    return {
+        "timepoints": wall.tolist(),
+        "median": float(np.median(wall)),
+        "mean": float(np.mean(wall)),
+        "std": float(np.std(wall)),
+        "cpu_timepoints": (np.array(cpu_ns) / 1e6).tolist(),
+    }
+
+
+def benchmark_transform(f, seqs, patterns, warmup, memory):
+    """
+    Benchmark the phases of a BWT class
+
+    Inputs are generated beforehand. The first warmup inputs are run
+    untimed, then every phase is timed alone with perf_counter_ns and
+    process_time_ns. With memory set, each phase is run once more under
+    tracemalloc, in a fresh child process, outside of the timed runs.
+
+    Parameters
+    ----------
+    f : class
+        BWT class
+    seqs : list
+        sequences, warm-up ones first
+    patterns : list
+        patterns of each sequence
+    warmup : int
+        number of warm-up sequences
+    memory : bool
+        whether to measure peak memory
+
+    Returns
+    -------
+    dict
+        summary of each phase, by name
+    """
+    n, rep = len(seqs[0]), len(seqs) - warmup
     print(f"Benchmarking {f.__name__} for {rep} sequences of length {n}")
-    timepoints = []
-    start_time = time.time()
-    for _ in range(rep):
-        b = f(generate_seq(n))
-        if mprofile:
-            profile(b.transform())
-        else:
-            b.transform()
-        timepoints.append(time.time() - start_time)
-        start_time = time.time()
-    # convert times to ms
-    timepoints = list(map(lambda x: x * 1000, timepoints))
-    return timepoints
+    wall, cpu = {}, {}
+    for i, (seq, queries) in enumerate(zip(seqs, patterns)):
+        for name, step in phases(f, seq, queries):
+            start_wall, start_cpu = time.perf_counter_ns(), time.process_time_ns()
+            step()
+            stop_wall, stop_cpu = time.perf_counter_ns(), time.process_time_ns()
+            if i >= warmup:
+                wall.setdefault(name, []).append(stop_wall - start_wall)
+                cpu.setdefault(name, []).append(stop_cpu - start_cpu)
+    results = {name: summarize(wall[name], cpu[name]) for name in wall}
+
+    if memory:
+        with mp.get_context("spawn").Pool(1) as pool:
+            peaks, rss = pool.apply(memory_profile, (f, seqs[-1], patterns[-1]))
+        for name, peak in peaks.items():
+            results[name]["peak_bytes"] = peak
+        results["construction"]["peak_rss_bytes"] = rss
+    return results
 
 
 if __name__ == "__main__":
@@ -120,24 +336,24 @@ if __name__ == "__main__":
         "isbwt": isbwt.isbwt,
     }
 
+    rng = np.random.default_rng(args.seed)
     for length in args.sequences:
+        seqs = [generate_seq(length, rng) for _ in range(args.warmup + args.nreps)]
+        patterns = [
+            generate_patterns(s, args.queries, args.query_length, rng) for s in seqs
+        ]
         runtimes[length] = {}
         for algo in args.algorithm:
-            runtimes[length][algo] = {}
-            runtimes[length][algo]["timepoints"] = benchmark_transform(
-                length, args.nreps, functions[algo], args.memory
-            )
-            runtimes[length][algo]["median"] = np.median(
-                runtimes[length][algo]["timepoints"]
-            )
-            runtimes[length][algo]["mean"] = np.mean(
-                runtimes[length][algo]["timepoints"]
-            )
-            runtimes[length][algo]["std"] = np.std(
-                runtimes[length][algo]["timepoints"]
+            runtimes[length][algo] = benchmark_transform(
+                functions[algo], seqs, patterns, args.warmup, args.memory
             )
 
-    if args.runtime:
+    report = {
+        "metadata": {**machine_metadata(), "arguments": vars(args)},
+        "results": runtimes,
+    }
+    if args.runtime or args.output:
         timestr = time.strftime("%Y%m%d-%H%M%S")
-        with open(f"results/runtimes_{timestr}.json", "w") as fp:
-            json.dump(runtimes, fp)
+        output = args.output or f"results/runtimes_{timestr}.json"
+        with open(output, "w") as fp:
+            json.dump(report, fp, indent=1)
@@ -1,5 +1,9 @@
 import numpy as np
 
+import encoding
+import isbwt
+import lfmap
+
 
 class bwt:
     """
@@ -7,15 +11,24 @@ class bwt:
 
     Parameters
     ----------
-    s : str
+    s : str or encoding.PackedSeq
         string to transform
+    method : str
+        "sa" to read the transform from the suffix array, or "matrix" to sort
+        the full rotation matrix, kept as a quadratic reference
 
     Attributes
     ----------
     s : np.array
-        string to transform
+        integer codes of the string to transform, ending with the sentinel
+    alphabet : str
+        character of each code
+    method : str
+        construction method
+    SA : np.array
+        suffix array, rows of the sorted rotation matrix
     transformed : np.array
-        transformed string
+        integer codes of the transformed string, one byte per code
     count_table : list
         count table
     alpha : dict
@@ -25,6 +38,8 @@ class bwt:
     -------
     calc_matrix()
         calculate the matrix
+    calc_suffix_array()
+        calculate the suffix array
     transform()
         transform the string
     count_alpha()
@@ -33,28 +48,49 @@ class bwt:
         generate the position
     inverse()
         inverse the transform
+    packed()
+        2-bit packed transformed string
     """
 
-    def __init__(self, s):
-        self.s = np.array(list(s), dtype=np.unicode_)
+    def __init__(self, s, method="sa"):
+        if method not in ("sa", "matrix"):
+            raise ValueError(f"unknown construction method: {method}")
+        self.s, self.alphabet = encoding.terminated(s)
+        self.method = method
+        self.SA = []
         self.transformed = []
         self.count_table = []
         self.alpha = {}
 
     def calc_matrix(self):
         """
-        Calculate the BWT matrix
+        Calculate the BWT matrix, in O(n^2) memory, for reference only
 
         Returns
         -------
         np.array
             BWT matrix
         """
-        s = np.append(self.s, "$")
-        matrix = np.empty([len(s), len(s)], dtype=np.unicode_)
+        s = self.s
+        matrix = np.empty([len(s), len(s)], dtype=np.uint8)
         for i in range(len(s)):
             matrix[i] = np.concatenate([s[i: len(s)], s[0:i]])
-        return matrix[matrix[:, 0].argsort()]
+        # sort the rows on all their columns, the first one being the primary key
+        self.SA = np.lexsort(matrix.T[::-1])
+        return matrix[self.SA]
+
+    def calc_suffix_array(self):
+        """
+        Calculate the suffix array, whose order matches the sorted rotations
+        thanks to the unique sentinel
+
+        Returns
+        -------
+        np.array
+            indices of the sorted suffix array
+        """
+        self.SA = isbwt.sais(self.s, len(self.alphabet))
+        return self.SA
 
     def transform(self):
         """
@@ -65,7 +101,10 @@ class bwt:
         np.array
             transformed string
         """
-        self.transformed = self.calc_matrix()[:, -1]
+        if self.method == "matrix":
+            self.transformed = self.calc_matrix()[:, -1]
+        else:
+            self.transformed = self.s[self.calc_suffix_array() - 1]
         return self.transformed
 
     def count_alpha(self):
@@ -119,16 +158,15 @@ class bwt:
         str
             original string
         """
-        if not self.transformed:
+        if len(self.transformed) == 0:
             self.transform()
-        p = 0
-        s = "$"
-        x = 0
-        while x != "$":
-            x = self.transformed[p]
-            s = x + s
-            p = self.alpha[self.s[p]] + self.count_table[p]
-        return s[1:]
+        return encoding.decode(lfmap.inverse_codes(self.transformed), self.alphabet)
+
+    def packed(self):
+        """
+        Pack the transformed string on 2 bits per base
+        """
+        return encoding.pack_transform(self)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,55 @@
+import numpy as np
+
+import encoding
+import lfmap
+
+
+def lyndon_starts(codes):
+    """
+    Calculate the Lyndon factorization of integer codes using Duval's
+    algorithm, as the start offsets of the factors
+
+    Parameters
+    ----------
+    codes : np.array
+        integer codes of the string
+
+    Returns
+    -------
+    np.array
+        start offset of each factor, as np.int64, factor f spanning
+        [starts[f], starts[f + 1])
+    """
+    n = len(codes)
+    starts = np.empty(n, dtype=np.int64)
+    # memoryviews give fast scalar access without building Python objects
+    t, out = memoryview(np.ascontiguousarray(codes)), memoryview(starts)
+    count = 0
+    i = 0
+    while i < n:
+        j = i + 1
+        k = i
+        while j < n and t[k] <= t[j]:
+            if t[k] < t[j]:
+                k = i
+            else:
+                k += 1
+            j += 1
+        period = j - k
+        while i <= k:
+            out[count] = i
+            count += 1
+            i += period
+    return starts[:count]
+
+
 class bwts:
     """
     Scottification of the Burrows-Wheeler transform.
 
     Parameters
     ----------
-    s : str
+    s : str or encoding.PackedSeq
         string to transform
 
     Attributes
@@ -16,24 +61,52 @@ class bwts:
 
     Methods
     -------
+    codes()
+        byte codes of the string
+    factor_starts()
+        start offsets of the Lyndon factors
     lf_duval()
         calculate the Lyndon factorization using Duval's algorithm
     lf_conjugates()
         calculate the conjugates of the Lyndon factors
+    conjugate_order()
+        sort the conjugates of the Lyndon factors without building them
     transform()
         transform the string
     sorted_keys()
-        sorted indices of the transformed string
-    find_cycles()
-        find the cycles of the sorted indices
+        standard permutation of the transformed string
     inverse()
         inverse the transform
+    packed()
+        2-bit packed transformed string
     """
 
     def __init__(self, s):
-        self.s = s
+        self.s = str(s) if isinstance(s, encoding.PackedSeq) else s
         self.transformed = ""
 
+    def codes(self):
+        """
+        Byte codes of the string, in the order of its characters
+
+        Returns
+        -------
+        np.array
+            codes of the string, as np.uint8
+        """
+        return np.frombuffer(self.s.encode("latin-1"), dtype=np.uint8)
+
+    def factor_starts(self):
+        """
+        Calculate the start offsets of the Lyndon factors
+
+        Returns
+        -------
+        np.array
+            start offset of each factor, as np.int64
+        """
+        return lyndon_starts(self.codes())
+
     def lf_duval(self):
         """
         Calculate the Lyndon factorization using Duval's algorithm
@@ -43,21 +116,8 @@ class bwts:
         list
             Lyndon factorization
         """
-        i = 0
-        factors = []
-        while i < len(self.s):
-            j = i + 1
-            k = i
-            while j < len(self.s) and self.s[k] <= self.s[j]:
-                if self.s[k] < self.s[j]:
-                    k = i
-                else:
-                    k += 1
-                j += 1
-            while i <= k:
-                factors.append(self.s[i : (i + j - k)])
-                i += j - k
-        return factors
+        bounds = np.append(self.factor_starts(), len(self.s)).tolist()
+        return [self.s[i:j] for i, j in zip(bounds, bounds[1:])]
 
     def lf_conjugates(self):
         """
@@ -75,6 +135,48 @@ class bwts:
                 ret.append(factor[-idx:] + factor[:-idx])
         return ret
 
+    def conjugate_order(self):
+        """
+        Sort the conjugates of the Lyndon factors in infinite-periodic order
+
+        Each text position stands for the conjugate of its factor starting
+        there. Conjugates are ranked by prefix doubling over the cyclic
+        successor of each position inside its factor, two distinct periodic
+        words u and v differing within their first |u| + |v| characters.
+
+        Returns
+        -------
+        np.array
+            positions of the conjugates, in sorted order
+        np.array
+            cyclic predecessor of each position inside its factor
+        """
+        n = len(self.s)
+        dtype = encoding.index_dtype(n)
+        starts = self.factor_starts().astype(dtype)
+        lengths = np.diff(np.append(starts, n)).astype(dtype)
+
+        positions = np.arange(n, dtype=dtype)
+        start = np.repeat(starts, lengths)
+        size = np.repeat(lengths, lengths)
+        succ = start + (positions - start + 1) % size
+        pred = start + (positions - start - 1) % size
+
+        _, rank = np.unique(self.codes(), return_inverse=True)
+        rank = rank.astype(np.int64)
+        h = 1
+        n_ranks = rank.max() + 1 if n else 0
+        while h < 2 * lengths.max(initial=0):
+            keys = rank * n_ranks + rank[succ]
+            _, rank = np.unique(keys, return_inverse=True)
+            new_ranks = rank.max() + 1
+            if new_ranks == n_ranks:
+                break
+            n_ranks = new_ranks
+            succ = succ[succ]
+            h *= 2
+        return np.argsort(rank, kind="stable"), pred
+
     def transform(self):
         """
         Transform the string
@@ -84,67 +186,75 @@ class bwts:
         str
             transformed string
         """
-        transformed = "".join(map(lambda x: x[-1], sorted(self.lf_conjugates())))
+        order, pred = self.conjugate_order()
+        transformed = self.codes()[pred[order]].tobytes().decode("latin-1")
         self.transformed = transformed
         return transformed
 
     def sorted_keys(self):
         """
-        Calculate the sorted indices of the transformed string
+        Calculate the standard permutation of the transformed string, with a
+        stable counting sort over its integer codes
 
         Returns
         -------
-        list
-            sorted indices
+        np.array
+            row reached from each row by the LF mapping
         """
-        transformed = self.transform()
-        return sorted(range(len(transformed)), key=transformed.__getitem__)
-
-    # def map(self):
-    #     sorted_transformed = np.sort(self.transformed)
-    #     start = np.searchsorted(
-    #         sorted_transformed, self.transformed, side='left')
-    #     cum_sum = cum_sum = np.cumsum(
-    #         self.transformed == self.transformed.reshape(-1, 1), axis=1)
-    #     count_occ = np.diagonal(cum_sum) - 1
-    #     summed = start + count_occ
-    #     sorter = summed.argsort()
-    #     i = np.arange(len(self.transformed))
-    #     return sorter[np.searchsorted(summed, i, sorter=sorter)]
-
-    def find_cycles(self):
-        """
-        Find the cycles of the sorted indices
-
-        Returns
-        -------
-        list
-            cycles
-        """
-        sorted_keys = self.sorted_keys()
-        visited = set()
-        cycles = []
-        for i in sorted_keys:
-            if i in visited:
-                continue
-            path = [i]
-            j = sorted_keys[i]
-            while i != j:
-                path.append(j)
-                j = sorted_keys[j]
-            else:
-                cycles.append(path)
-                visited |= set(path)
-        return cycles[::-1]
+        return lfmap.lf_mapping(lfmap.encode(self.transformed)[1])
 
     def inverse(self):
         """
-        Inverse the transform using the cycles
+        Inverse the transform using the cycles of the standard permutation
 
         Returns
         -------
         str
             inverse transform
         """
-        cycles = self.find_cycles()
-        return "".join(map(lambda i: self.s[i], sum(cycles, [])))
+        if not self.transformed:
+            self.transform()
+        return inverse(self.transformed)
+
+    def packed(self):
+        """
+        Pack the transformed string on 2 bits per base
+        """
+        return encoding.pack_transform(self)
+
+
+def inverse(transformed):
+    """
+    Inverse a bijective transform from the transformed string alone
+
+    Each cycle of the LF mapping spells one Lyndon factor backwards from the
+    row of its smallest conjugate. Scanning rows in increasing order meets
+    the factors from the smallest, which is the last one of the string, so
+    the output buffer is filled from right to left.
+
+    Parameters
+    ----------
+    transformed : str
+        transformed string
+
+    Returns
+    -------
+    str
+        original string
+    """
+    alphabet, codes = lfmap.encode(transformed)
+    n = len(codes)
+    out = np.empty(n, dtype=np.uint8)
+    visited = np.zeros(n, dtype=np.bool_)
+    L, LF = memoryview(codes), memoryview(lfmap.lf_mapping(codes))
+    o, seen = memoryview(out), memoryview(visited)
+    pos = n
+    for k in range(n):
+        j = k
+        while not seen[j]:
+            seen[j] = True
+            pos -= 1
+            o[pos] = L[j]
+            j = LF[j]
+    table = np.frombuffer("".join(alphabet).encode("latin-1"), dtype=np.uint8)
+    return table[out].tobytes().decode("latin-1")
@@ -0,0 +1,662 @@
+import numpy as np
+
+import encoding
+import isbwt
+from fmindex import PRESETS, FMIndex
+
+# a segment is merged into the previous one unless that one is at least
+# this many times larger, so sizes shrink geometrically along the segments
+GROWTH = 2
+
+
+def collection_sa(seqs):
+    """
+    Suffix array of a collection of DNA sequences, each one ending with its
+    own sentinel
+
+    Sentinels are ordered by sequence, so that equal suffixes of two
+    sequences are sorted by sequence index, and suffixes never run across a
+    sentinel into the next sequence. Each sentinel gets its own code below
+    the DNA codes, and a final terminator makes the text suitable for SA-IS.
+
+    Parameters
+    ----------
+    seqs : list
+        DNA sequences
+
+    Returns
+    -------
+    np.array
+        codes of the concatenated sequences, each followed by a "$" of code 0
+    np.array
+        suffix array of the concatenation
+    """
+    k = len(seqs)
+    codes = [np.append(encoding.encode(s), np.uint8(0)) for s in seqs]
+    text = np.concatenate(codes) if codes else np.empty(0, dtype=np.uint8)
+    # sentinel i gets code i + 1, bases are shifted above every sentinel
+    t = text.astype(np.int64) + k
+    ends = np.cumsum([len(c) for c in codes]) - 1
+    t[ends] = np.arange(1, k + 1)
+    t = np.append(t, 0).astype(encoding.index_dtype(len(t) + 1))
+    sa = isbwt.sais(t, k + len(encoding.ALPHABET))
+    return text, sa[1:].astype(np.int64)
+
+
+class CollectionIndex(FMIndex):
+    """
+    FM-index of a collection of DNA sequences, such as consensus genomes,
+    that can grow without rebuilding
+
+    The transformed string holds one "$" per sequence. A row whose suffix
+    is a whole sequence has "$" as transformed character, and is resolved
+    through the sequence of that "$" instead of being LF-mapped across it.
+
+    Attributes
+    ----------
+    seq_starts : np.array
+        start of each sequence in the concatenation, each sequence being
+        followed by its "$"
+    dollar_seqs : np.array
+        sequence of each "$" of the transformed string, in row order
+    isa_positions : np.array
+        text positions of the sampled suffixes, in text order, merged
+        collections sampling positions that are not multiples of sa_rate
+
+    Methods
+    -------
+    from_sequences(seqs, preset)
+        build the index of a collection
+    strings()
+        number of sequences
+    interleave(other)
+        rows of this index preceding each row of another one
+    merge(other)
+        index of the union of two collections
+    append(seqs)
+        index of the collection extended with new sequences
+    extract(start, end)
+        substring of the concatenation, "$" separators included
+    split(positions)
+        sequence and offset of collection positions
+    """
+
+    def __init__(self, seqs, occ_rate=64, sa_rate=16):
+        text, sa = collection_sa(seqs)
+        super().__init__(text[sa - 1], sa, occ_rate, sa_rate, encoding.ALPHABET)
+        lengths = np.array([len(s) + 1 for s in seqs], dtype=np.int64)
+        self.seq_starts = np.cumsum(lengths) - lengths
+        self.dollar_seqs = np.searchsorted(self.seq_starts, sa[self.bwt == 0])
+        self.isa_positions = np.sort(self.sa_samples)
+
+    @classmethod
+    def from_sequences(cls, seqs, preset="balanced"):
+        """
+        Build the index of a collection of sequences
+
+        Parameters
+        ----------
+        seqs : list
+            DNA sequences
+        preset : str
+            sampling rates, one of fmindex.PRESETS
+
+        Returns
+        -------
+        CollectionIndex
+            index of the collection
+        """
+        # merging splices the transformed strings, so a collection keeps
+        # its BWT and checkpoints whatever the rank structure of the preset
+        occ_rate, sa_rate, _ = PRESETS[preset]
+        return cls(seqs, occ_rate, sa_rate)
+
+    @classmethod
+    def from_arrays(cls, alphabet, occ_rate, sa_rate, arrays):
+        """
+        Wrap existing index arrays, sequence arrays included, without
+        copying them
+        """
+        index = super().from_arrays(alphabet, occ_rate, sa_rate, arrays)
+        index.seq_starts = arrays["seq_starts"]
+        index.dollar_seqs = arrays["dollar_seqs"]
+        index.isa_positions = arrays["isa_positions"]
+        return index
+
+    def arrays(self):
+        """
+        Arrays holding the index, sequence arrays included
+        """
+        arrays = super().arrays()
+        arrays["seq_starts"] = self.seq_starts
+        arrays["dollar_seqs"] = self.dollar_seqs
+        arrays["isa_positions"] = self.isa_positions
+        return arrays
+
+    def strings(self):
+        """
+        Number of sequences of the collection
+
+        Returns
+        -------
+        int
+            number of sequences
+        """
+        return len(self.seq_starts)
+
+    def interleave(self, other):
+        """
+        Place the rows of another collection index among the rows of this
+        one, the other sequences coming after these
+
+        Each sequence of the other index is walked backwards from its "$"
+        row by LF-mapping in both indexes at once, so the work is one pair of
+        rank queries per row of the other index, whatever the size of this
+        one. This is the interleave of the two transformed strings, given as
+        insertion points rather than as a bitvector.
+
+        Parameters
+        ----------
+        other : CollectionIndex
+            index of the other collection
+
+        Returns
+        -------
+        np.array
+            number of rows of this index preceding each row of the other
+        """
+        smaller = np.empty(len(other), dtype=np.int64)
+        m = self.strings()
+        for i in range(other.strings()):
+            # rows of "$" come by sequence, those of this index first
+            row, ours = i, m
+            while True:
+                smaller[row] = ours
+                c = other.access(row)
+                if c == 0:
+                    break
+                row, ours = other.lf(c, row), self.lf(c, ours)
+        return smaller
+
+    def merge(self, other):
+        """
+        Merge with the index of another collection, whose sequences come
+        after those of this one
+
+        The other rows are placed by interleave, in one pair of rank queries
+        per row of the other index. The transformed strings are then
+        spliced, the checkpoints recounted and the samples shifted in
+        O(N) NumPy passes, N being the size of both collections.
+
+        Parameters
+        ----------
+        other : CollectionIndex
+            index of the other collection
+
+        Returns
+        -------
+        CollectionIndex
+            index of both collections
+        """
+        ins = self.interleave(other)
+        total = len(self)
+        ours, theirs = np.asarray(self.bwt), np.asarray(other.bwt)
+
+        index = CollectionIndex.__new__(CollectionIndex)
+        index.alphabet, index.code = self.alphabet, self.code
+        index.occ_rate, index.sa_rate = self.occ_rate, self.sa_rate
+        index.bwt = np.insert(ours, ins, theirs)
+        index.C = (np.asarray(self.C) + np.asarray(other.C)).astype(np.int64)
+        index.wavelet = None
+        index.occ = index.occurrences()
+
+        # shift the sampled rows by the rows inserted before them
+        rows = np.asarray(self.sa_rows, dtype=np.int64)
+        rows = rows + np.searchsorted(ins, rows, side="right")
+        other_rows = np.asarray(other.sa_rows, dtype=np.int64)
+        other_rows = ins[other_rows] + other_rows
+        rows = np.concatenate([rows, other_rows])
+        samples = np.concatenate(
+            [
+                np.asarray(self.sa_samples, dtype=np.int64),
+                np.asarray(other.sa_samples, dtype=np.int64) + total,
+            ]
+        )
+        order = np.argsort(rows)
+        index.sa_rows = rows[order].astype(np.uint32)
+        index.sa_samples = samples[order].astype(np.uint32)
+        order = np.argsort(samples)
+        index.isa_samples = rows[order].astype(np.uint32)
+        index.isa_positions = samples[order].astype(np.uint32)
+
+        index.seq_starts = np.concatenate(
+            [self.seq_starts, np.asarray(other.seq_starts) + total]
+        )
+        # "$" rows of the other index follow those of this one preceding them
+        at = np.searchsorted(np.flatnonzero(ours == 0), ins[theirs == 0])
+        index.dollar_seqs = np.insert(
+            np.asarray(self.dollar_seqs),
+            at,
+            np.asarray(other.dollar_seqs) + self.strings(),
+        )
+        return index
+
+    def append(self, seqs):
+        """
+        Extend the collection with new sequences
+
+        The new sequences are indexed on their own and merged in. Only their
+        rows are LF-walked, but splicing them in and recounting the
+        occurrence checkpoints are linear NumPy passes over the whole
+        collection.
+
+        Parameters
+        ----------
+        seqs : list
+            DNA sequences to add, after the existing ones
+
+        Returns
+        -------
+        CollectionIndex
+            index of the extended collection
+        """
+        return self.merge(CollectionIndex(seqs, self.occ_rate, self.sa_rate))
+
+    def resolve(self, row):
+        """
+        Recover the text position of a suffix array row, LF-walking back to
+        the nearest sampled suffix or to the start of its sequence
+
+        Parameters
+        ----------
+        row : int
+            row of the suffix array
+
+        Returns
+        -------
+        int
+            position of the suffix in the concatenation
+        """
+        steps = 0
+        while True:
+            j = np.searchsorted(self.sa_rows, row)
+            if j < len(self.sa_rows) and self.sa_rows[j] == row:
+                return int(self.sa_samples[j]) + steps
+            c = self.access(row)
+            if c == 0:
+                seq = self.dollar_seqs[self.rank(0, row)]
+                return int(self.seq_starts[seq]) + steps
+            row = self.lf(c, row)
+            steps += 1
+
+    def anchor(self, end):
+        """
+        Find the nearest suffix at or after a text position whose row is
+        known, without leaving the sequence of the position before it
+
+        The "$" ending that sequence is the fallback, its row being the
+        index of the sequence.
+
+        Parameters
+        ----------
+        end : int
+            text position, inside a sequence or on its "$"
+
+        Returns
+        -------
+        int
+            text position of the suffix
+        int
+            row of the suffix
+        """
+        seq = int(np.searchsorted(self.seq_starts, end - 1, side="right")) - 1
+        if seq + 1 < self.strings():
+            dollar = int(self.seq_starts[seq + 1]) - 1
+        else:
+            dollar = len(self) - 1
+        k = np.searchsorted(self.isa_positions, end)
+        if k < len(self.isa_positions) and self.isa_positions[k] <= dollar:
+            return int(self.isa_positions[k]), int(self.isa_samples[k])
+        return dollar, seq
+
+    def extract(self, start, end):
+        """
+        Extract a substring of the concatenated sequences, one sequence at
+        a time so that the LF walk never crosses a "$"
+
+        Parameters
+        ----------
+        start : int
+            first position
+        end : int
+            position following the last one, capped by the concatenation
+            length
+
+        Returns
+        -------
+        str
+            concatenation between start and end, "$" separators included
+        """
+        end = min(end, len(self))
+        pieces = []
+        while start < end:
+            seq = int(np.searchsorted(self.seq_starts, start, side="right")) - 1
+            if seq + 1 < self.strings():
+                dollar = int(self.seq_starts[seq + 1]) - 1
+            else:
+                dollar = len(self) - 1
+            pieces.append(super().extract(start, min(end, dollar)))
+            if end > dollar:
+                pieces.append("$")
+            start = dollar + 1
+        return "".join(pieces)
+
+    def split(self, positions):
+        """
+        Map positions in the concatenation to the sequence they fall in
+
+        Parameters
+        ----------
+        positions : np.array
+            positions in the concatenated sequences
+
+        Returns
+        -------
+        np.array
+            index of the sequence of each position
+        np.array
+            offset of each position in its sequence
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        seqs = np.searchsorted(self.seq_starts, positions, side="right") - 1
+        return seqs, positions - self.seq_starts[seqs]
+
+
+
+class SegmentedCollection:
+    """
+    Collection of DNA sequences indexed as several independent segments,
+    searched together and merged geometrically as sequences are appended
+
+    Each append indexes the new sequences as a segment of their own, then
+    merges the last two segments as long as the previous one is less than
+    GROWTH times larger than the last. Segment sizes thus shrink
+    geometrically, there are O(log N) of them, and every character is
+    merged O(log N) times over all appends, so the amortised cost of an
+    append is proportional to the added data times the number of segments
+    rather than to the size of the collection.
+
+    Parameters
+    ----------
+    segments : list
+        CollectionIndex of each segment, sequences of a segment coming
+        after those of the previous ones
+
+    Attributes
+    ----------
+    segments : list
+        CollectionIndex of each segment
+    starts : np.array
+        start of each segment in the concatenation of all sequences
+    seq_starts : np.array
+        start of each sequence in the concatenation, each sequence being
+        followed by its "$"
+
+    Methods
+    -------
+    from_sequences(seqs, preset)
+        build a single segment index of a collection
+    from_arrays(alphabet, occ_rate, sa_rate, arrays)
+        wrap existing segment arrays without copying them
+    arrays()
+        arrays holding the segments
+    strings()
+        number of sequences
+    append(seqs)
+        index of the collection extended with new sequences
+    compact()
+        single CollectionIndex of the whole collection
+    count(pattern)
+        number of occurrences of the pattern
+    locate(pattern)
+        positions of the pattern in the concatenation
+    extract(start, end)
+        substring of the concatenation, "$" separators included
+    split(positions)
+        sequence and offset of collection positions
+    nbytes()
+        memory footprint of the segments
+    """
+
+    def __init__(self, segments):
+        self.segments = list(segments)
+        lengths = np.array([len(s) for s in self.segments], dtype=np.int64)
+        self.starts = np.cumsum(lengths) - lengths
+        self.seq_starts = np.concatenate(
+            [np.asarray(s.seq_starts, dtype=np.int64) for s in self.segments]
+            + [np.empty(0, dtype=np.int64)]
+        )
+        counts = [s.strings() for s in self.segments]
+        self.seq_starts += np.repeat(self.starts, counts)
+        self.alphabet = self.segments[0].alphabet
+        self.occ_rate = self.segments[0].occ_rate
+        self.sa_rate = self.segments[0].sa_rate
+
+    @classmethod
+    def from_sequences(cls, seqs, preset="balanced"):
+        """
+        Build the index of a collection as a single segment
+
+        Parameters
+        ----------
+        seqs : list
+            DNA sequences
+        preset : str
+            sampling rates, one of fmindex.PRESETS
+
+        Returns
+        -------
+        SegmentedCollection
+            index of the collection
+        """
+        return cls([CollectionIndex.from_sequences(seqs, preset)])
+
+    @classmethod
+    def from_arrays(cls, alphabet, occ_rate, sa_rate, arrays):
+        """
+        Wrap existing segment arrays, named as by arrays(), without copying
+        them
+        """
+        segments = {}
+        for key, array in arrays.items():
+            prefix, name = key.split(".", 1)
+            segments.setdefault(int(prefix[len("segment") :]), {})[name] = array
+        return cls(
+            CollectionIndex.from_arrays(alphabet, occ_rate, sa_rate, segments[i])
+            for i in sorted(segments)
+        )
+
+    def arrays(self):
+        """
+        Arrays holding the segments, named "segment<i>.<name>"
+
+        Returns
+        -------
+        dict
+            segment arrays, by name
+        """
+        return {
+            f"segment{i}.{name}": array
+            for i, segment in enumerate(self.segments)
+            for name, array in segment.arrays().items()
+        }
+
+    def __len__(self):
+        return int(self.starts[-1]) + len(self.segments[-1])
+
+    def strings(self):
+        """
+        Number of sequences of the collection
+
+        Returns
+        -------
+        int
+            number of sequences
+        """
+        return len(self.seq_starts)
+
+    def append(self, seqs):
+        """
+        Extend the collection with new sequences, indexed as a new segment
+        merged with the last ones while they are not GROWTH times larger
+
+        Segments that are not merged are shared with this collection.
+
+        Parameters
+        ----------
+        seqs : list
+            DNA sequences to add, after the existing ones
+
+        Returns
+        -------
+        SegmentedCollection
+            index of the extended collection
+        """
+        segments = self.segments + [
+            CollectionIndex(seqs, self.occ_rate, self.sa_rate)
+        ]
+        while len(segments) > 1 and len(segments[-2]) < GROWTH * len(segments[-1]):
+            last = segments.pop()
+            segments[-1] = segments[-1].merge(last)
+        return SegmentedCollection(segments)
+
+    def compact(self):
+        """
+        Merge every segment into a single index
+
+        Returns
+        -------
+        CollectionIndex
+            index of the whole collection
+        """
+        index = self.segments[0]
+        for segment in self.segments[1:]:
+            index = index.merge(segment)
+        return index
+
+    def count(self, pattern):
+        """
+        Count the occurrences of the pattern in every segment
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to count
+
+        Returns
+        -------
+        int
+            number of occurrences
+        """
+        return sum(segment.count(pattern) for segment in self.segments)
+
+    def locate(self, pattern):
+        """
+        Locate the occurrences of the pattern in every segment
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to locate
+
+        Returns
+        -------
+        np.array
+            sorted positions of the pattern in the concatenation
+        """
+        return np.concatenate(
+            [
+                segment.locate(pattern) + start
+                for segment, start in zip(self.segments, self.starts.tolist())
+            ]
+        )
+
+    def extract(self, start, end):
+        """
+        Extract a substring of the concatenated sequences, one segment at a
+        time
+
+        Parameters
+        ----------
+        start : int
+            first position
+        end : int
+            position following the last one, capped by the concatenation
+            length
+
+        Returns
+        -------
+        str
+            concatenation between start and end, "$" separators included
+        """
+        pieces = []
+        for segment, first in zip(self.segments, self.starts.tolist()):
+            if start < first + len(segment) and end > first:
+                pieces.append(segment.extract(max(start - first, 0), end - first))
+        return "".join(pieces)
+
+    def split(self, positions):
+        """
+        Map positions in the concatenation to the sequence they fall in
+
+        Parameters
+        ----------
+        positions : np.array
+            positions in the concatenated sequences
+
+        Returns
+        -------
+        np.array
+            index of the sequence of each position
+        np.array
+            offset of each position in its sequence
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        seqs = np.searchsorted(self.seq_starts, positions, side="right") - 1
+        return seqs, positions - self.seq_starts[seqs]
+
+    def nbytes(self):
+        """
+        Memory footprint of the segment arrays
+
+        Returns
+        -------
+        int
+            size in bytes
+        """
+        return sum(segment.nbytes() for segment in self.segments)
+
+
+if __name__ == "__main__":
+    from random import choice, randrange, seed
+
+    seed(0)
+    genome = "".join(choice("ACGT") for _ in range(5000))
+
+    def variant():
+        v = list(genome)
+        for _ in range(5):
+            v[randrange(len(v))] = choice("ACGT")
+        return "".join(v)
+
+    index = CollectionIndex.from_sequences([variant() for _ in range(4)])
+    index = index.append([variant()])
+    index = index.merge(CollectionIndex.from_sequences([variant(), variant()]))
+    pattern = genome[100:120]
+    print(index.strings(), index.count(pattern), index.split(index.locate(pattern)))
+
+    segmented = SegmentedCollection.from_sequences([variant() for _ in range(4)])
+    for _ in range(6):
+        segmented = segmented.append([variant()])
+    sizes = [segment.strings() for segment in segmented.segments]
+    print(sizes, segmented.count(pattern), segmented.split(segmented.locate(pattern)))
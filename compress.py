@@ -0,0 +1,468 @@
+import argparse
+import bz2
+import gzip
+import multiprocessing as mp
+import os
+import struct
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+import bwts
+import huffman
+import isbwt
+import lfmap
+import sabwt
+
+MAGIC = b"BWZ\1"
+
+# transform of each block, bwts needing no primary index
+ENGINES = ("bwts", "isbwt", "sabwt")
+
+# zero runs take symbols 0 and 1, move-to-front index v takes v + 1
+RUNA, RUNB = 0, 1
+N_SYMBOLS = 257
+
+# raw length, primary index (-1 for bwts), symbols and payload length
+_BLOCK = struct.Struct("<IiII")
+
+parser = argparse.ArgumentParser(
+    description="compress files with a block-sorting transform"
+)
+parser.add_argument("input", help="file to compress, or to decompress with -d")
+parser.add_argument("output", help="output file")
+parser.add_argument(
+    "-d",
+    "--decompress",
+    action="store_true",
+    help="decompress the input",
+)
+parser.add_argument(
+    "-e",
+    "--engine",
+    default="bwts",
+    choices=ENGINES,
+    help="block transform",
+)
+parser.add_argument(
+    "-b",
+    "--block-size",
+    type=int,
+    default=1 << 20,
+    help="block size, in bytes",
+)
+parser.add_argument(
+    "-t",
+    "--threads",
+    type=int,
+    default=os.cpu_count(),
+    help="number of worker processes",
+)
+parser.add_argument(
+    "-c",
+    "--compare",
+    action="store_true",
+    help="compare size and speed with gzip and bzip2",
+)
+
+
+def block_transform(block, engine):
+    """
+    Transform a block of bytes
+
+    Parameters
+    ----------
+    block : bytes
+        block to transform
+    engine : str
+        transform, one of ENGINES
+
+    Returns
+    -------
+    np.array
+        transformed bytes
+    int
+        row of the original block among the sorted suffixes, -1 for bwts
+    """
+    if engine == "bwts":
+        transformed = bwts.bwts(block.decode("latin-1")).transform()
+        return np.frombuffer(transformed.encode("latin-1"), dtype=np.uint8), -1
+    # bytes are shifted above a unique sentinel of code 0
+    t = np.append(np.frombuffer(block, dtype=np.uint8).astype(np.int32) + 1, 0)
+    if engine == "isbwt":
+        sa = isbwt.sais(t, 257)
+    else:
+        sa = sabwt.prefix_doubling(t)
+    last = t[sa - 1]
+    primary = int(np.flatnonzero(last == 0)[0])
+    return (np.delete(last, primary) - 1).astype(np.uint8), primary
+
+
+def block_inverse(transformed, primary):
+    """
+    Inverse the transform of a block
+
+    Parameters
+    ----------
+    transformed : np.array
+        transformed bytes
+    primary : int
+        row of the original block, -1 for bwts
+
+    Returns
+    -------
+    bytes
+        original block
+    """
+    if primary < 0:
+        return bwts.inverse(transformed.tobytes().decode("latin-1")).encode("latin-1")
+    # the sentinel goes back in as the smallest code
+    codes = np.insert(transformed.astype(np.int16), primary, -1)
+    lf = lfmap.lf_mapping(codes)
+    out = np.empty(len(transformed), dtype=np.uint8)
+    L, LF, o = memoryview(codes), memoryview(lf), memoryview(out)
+    p = 0
+    for k in range(len(out) - 1, -1, -1):
+        o[k] = L[p]
+        p = LF[p]
+    return out.tobytes()
+
+
+def move_to_front(data):
+    """
+    Move-to-front encode bytes, one step per run of equal bytes
+
+    Parameters
+    ----------
+    data : np.array
+        bytes
+
+    Returns
+    -------
+    np.array
+        index of each byte in the recency list, as np.uint8
+    """
+    out = np.zeros(len(data), dtype=np.uint8)
+    if len(data) == 0:
+        return out
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(data)) + 1])
+    table = list(range(256))
+    heads = []
+    for c in data[starts].tolist():
+        i = table.index(c)
+        heads.append(i)
+        if i:
+            del table[i]
+            table.insert(0, c)
+    # the other bytes of a run are already at the front
+    out[starts] = heads
+    return out
+
+
+def inverse_move_to_front(indices):
+    """
+    Decode move-to-front indices, one step per non-zero index
+
+    Parameters
+    ----------
+    indices : np.array
+        move-to-front indices
+
+    Returns
+    -------
+    np.array
+        decoded bytes, as np.uint8
+    """
+    moves = np.flatnonzero(indices)
+    table = list(range(256))
+    heads = []
+    for i in indices[moves].tolist():
+        c = table.pop(i)
+        table.insert(0, c)
+        heads.append(c)
+    # zero indices repeat the previous byte, or the initial front byte 0
+    values = np.concatenate([[0], heads]).astype(np.uint8)
+    last = np.zeros(len(indices), dtype=np.int64)
+    last[moves] = np.arange(1, len(moves) + 1)
+    return values[np.maximum.accumulate(last)]
+
+
+def zero_runs(indices):
+    """
+    Replace runs of zero indices by their length, written in bijective
+    base 2 with RUNA and RUNB digits, least significant first
+
+    A run of length r takes the bits of r + 1 below its leading one, RUNA
+    standing for a 0 bit and RUNB for a 1 bit.
+
+    Parameters
+    ----------
+    indices : np.array
+        move-to-front indices
+
+    Returns
+    -------
+    np.array
+        symbols, as np.int64
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    zero = indices == 0
+    # items are non-zero indices and whole zero runs
+    first = np.ones(len(indices), dtype=bool)
+    first[1:] = ~(zero[1:] & zero[:-1])
+    starts = np.flatnonzero(first)
+    sizes = np.diff(np.append(starts, len(indices)))
+    is_run = zero[starts]
+    digits = np.where(is_run, np.floor(np.log2(sizes + 1)).astype(np.int64), 1)
+    owner = np.repeat(np.arange(len(starts)), digits)
+    offset = np.arange(len(owner)) - np.repeat(np.cumsum(digits) - digits, digits)
+    run_bits = ((sizes[owner] + 1) >> offset) & 1
+    return np.where(is_run[owner], run_bits, indices[starts][owner] + 1)
+
+
+def inverse_zero_runs(symbols):
+    """
+    Expand the zero runs written by zero_runs
+
+    Parameters
+    ----------
+    symbols : np.array
+        symbols
+
+    Returns
+    -------
+    np.array
+        move-to-front indices, as np.int64
+    """
+    symbols = np.asarray(symbols, dtype=np.int64)
+    digit = symbols <= RUNB
+    first = np.ones(len(symbols), dtype=bool)
+    first[1:] = ~(digit[1:] & digit[:-1])
+    starts = np.flatnonzero(first)
+    item = np.cumsum(first) - 1
+    position = np.arange(len(symbols)) - starts[item]
+    # digit i of a run weighs (1 + bit) * 2 ** i
+    weights = np.where(digit, (1 + symbols) << position, 0)
+    runs = np.add.reduceat(weights, starts) if len(starts) else weights
+    is_run = digit[starts]
+    counts = np.where(is_run, runs, 1)
+    values = np.where(is_run, 0, symbols[starts] - 1)
+    return np.repeat(values, counts)
+
+
+def compress_block(block, engine="bwts"):
+    """
+    Compress a block of bytes
+
+    Parameters
+    ----------
+    block : bytes
+        block to compress
+    engine : str
+        transform, one of ENGINES
+
+    Returns
+    -------
+    bytes
+        compressed block, with its header
+    """
+    transformed, primary = block_transform(block, engine)
+    symbols = zero_runs(move_to_front(transformed))
+    lengths = huffman.code_lengths(np.bincount(symbols, minlength=N_SYMBOLS))
+    payload = huffman.encode(symbols, lengths)
+    header = _BLOCK.pack(len(block), primary, len(symbols), len(payload))
+    return header + lengths.tobytes() + payload
+
+
+def decompress_block(record):
+    """
+    Decompress a block written by compress_block
+
+    Parameters
+    ----------
+    record : bytes
+        compressed block, with its header
+
+    Returns
+    -------
+    bytes
+        original block
+    """
+    _, primary, count, size = _BLOCK.unpack_from(record)
+    start = _BLOCK.size + N_SYMBOLS
+    lengths = np.frombuffer(record[_BLOCK.size : start], dtype=np.uint8)
+    symbols = huffman.decode(record[start : start + size], count, lengths)
+    indices = inverse_zero_runs(symbols)
+    return block_inverse(inverse_move_to_front(indices), primary)
+
+
+def read_blocks(handle, size):
+    """
+    Read a stream in fixed-size blocks
+
+    Parameters
+    ----------
+    handle : io.BufferedIOBase
+        binary stream
+    size : int
+        block size, in bytes
+
+    Yields
+    ------
+    bytes
+        block, the last one may be shorter
+    """
+    while True:
+        block = handle.read(size)
+        if not block:
+            return
+        yield block
+
+
+def read_records(handle):
+    """
+    Read the compressed blocks of a stream, after its magic
+
+    Parameters
+    ----------
+    handle : io.BufferedIOBase
+        binary stream, positioned after the magic
+
+    Yields
+    ------
+    bytes
+        compressed block, with its header
+    """
+    while True:
+        header = handle.read(_BLOCK.size)
+        if not header:
+            return
+        size = _BLOCK.unpack(header)[3]
+        yield header + handle.read(N_SYMBOLS + size)
+
+
+def pipeline(func, items, processes, *args):
+    """
+    Apply a function to items on a pool of processes
+
+    Items are submitted lazily, at most two per process being in flight,
+    and results are yielded in input order.
+
+    Parameters
+    ----------
+    func : callable
+        function applied to each item, followed by args
+    items : iterable
+        items to process
+    processes : int
+        number of worker processes, items being processed in this process
+        when lower than 2
+
+    Yields
+    ------
+    object
+        result of each item
+    """
+    if processes < 2:
+        for item in items:
+            yield func(item, *args)
+        return
+    with mp.Pool(processes) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item, *args)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def compress(src, dst, engine="bwts", block_size=1 << 20, processes=1):
+    """
+    Compress a file block by block
+
+    Parameters
+    ----------
+    src : str
+        file to compress
+    dst : str
+        compressed file
+    engine : str
+        transform, one of ENGINES
+    block_size : int
+        block size, in bytes
+    processes : int
+        number of worker processes
+    """
+    with open(src, "rb") as handle, open(dst, "wb") as out:
+        out.write(MAGIC)
+        blocks = read_blocks(handle, block_size)
+        for record in pipeline(compress_block, blocks, processes, engine):
+            out.write(record)
+
+
+def decompress(src, dst, processes=1):
+    """
+    Decompress a file written by compress
+
+    Parameters
+    ----------
+    src : str
+        compressed file
+    dst : str
+        decompressed file
+    processes : int
+        number of worker processes
+    """
+    with open(src, "rb") as handle, open(dst, "wb") as out:
+        if handle.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"not a compressed file: {src}")
+        for block in pipeline(decompress_block, read_records(handle), processes):
+            out.write(block)
+
+
+def report(name, size, compressed, seconds):
+    """
+    Print the size, ratio and speed of a compressor
+
+    Parameters
+    ----------
+    name : str
+        name of the compressor
+    size : int
+        size of the original data, in bytes
+    compressed : int
+        size of the compressed data, in bytes
+    seconds : float
+        time taken
+    """
+    speed = size / 1e6 / seconds if seconds else float("inf")
+    print(f"{name}\t{compressed}\t{size / compressed:.3f}\t{speed:.2f} MB/s")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    args = parser.parse_args(args)
+
+    start = time.perf_counter()
+    if args.decompress:
+        decompress(args.input, args.output, args.threads)
+    else:
+        compress(args.input, args.output, args.engine, args.block_size, args.threads)
+    seconds = time.perf_counter() - start
+
+    raw, packed = args.input, args.output
+    if args.decompress:
+        raw, packed = packed, raw
+    size, compressed = os.path.getsize(raw), os.path.getsize(packed)
+    print("method\tbytes\tratio\tspeed")
+    report("unbwz" if args.decompress else args.engine, size, compressed, seconds)
+    if args.compare:
+        with open(raw, "rb") as handle:
+            data = handle.read()
+        for name, codec in (("gzip", gzip), ("bzip2", bz2)):
+            start = time.perf_counter()
+            compressed = len(codec.compress(data))
+            report(name, size, compressed, time.perf_counter() - start)
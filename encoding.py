@@ -0,0 +1,332 @@
+import numpy as np
+
+# order preserving codes, the sentinel being the smallest
+ALPHABET = "$ACGNT"
+N_CODE = ALPHABET.index("N")
+
+# code of every byte, 255 for characters outside of the DNA alphabet,
+# lowercase bases only being folded onto their codes by encode
+_CODES = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(ALPHABET):
+    _CODES[ord(_c)] = _i
+_FOLDED = _CODES.copy()
+for _i, _c in enumerate(ALPHABET):
+    _FOLDED[ord(_c.lower())] = _i
+
+# 2-bit value of every code, N and $ being stored as exceptions
+_TWO_BITS = np.array([0, 0, 1, 2, 0, 3], dtype=np.uint8)
+_FROM_TWO_BITS = np.array([1, 2, 3, 5], dtype=np.uint8)
+_EXCEPTIONS = np.array([True, False, False, False, True, False])
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+_COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+
+
+def index_dtype(n):
+    """
+    Smallest signed integer type able to index a text of length n
+
+    Parameters
+    ----------
+    n : int
+        length of the text
+
+    Returns
+    -------
+    np.dtype
+        np.int32 or np.int64
+    """
+    return np.int32 if n < 2**31 - 1 else np.int64
+
+
+def encode(s):
+    """
+    Encode a DNA string with the codes of ALPHABET
+
+    Parameters
+    ----------
+    s : str
+        DNA string, made of ACGTN and "$", lowercase bases being encoded as
+        uppercase ones
+
+    Returns
+    -------
+    np.array
+        codes of the string, as np.uint8
+    """
+    codes = _FOLDED[np.frombuffer(s.encode("latin-1"), dtype=np.uint8)]
+    if (codes == 255).any():
+        raise ValueError(f"not a DNA string: {s[:20]}")
+    return codes
+
+
+def decode(codes, alphabet=ALPHABET):
+    """
+    Decode integer codes into a string
+
+    Parameters
+    ----------
+    codes : np.array
+        codes to decode
+    alphabet : str
+        character of each code
+
+    Returns
+    -------
+    str
+        decoded string
+    """
+    table = np.frombuffer(alphabet.encode("latin-1"), dtype=np.uint8)
+    return table[codes].tobytes().decode("latin-1")
+
+
+def reverse_complement(s):
+    """
+    Reverse complement a DNA string
+
+    Parameters
+    ----------
+    s : str
+        DNA string
+
+    Returns
+    -------
+    str
+        reverse complement of the string
+    """
+    return s.translate(_COMPLEMENT)[::-1]
+
+
+def as_codes(s):
+    """
+    Encode any sequence with order preserving integer codes
+
+    Uppercase DNA strings and packed sequences use ALPHABET, other strings,
+    lowercase DNA included, are encoded over their own sorted alphabet so
+    that decoding gives them back unchanged.
+
+    Parameters
+    ----------
+    s : str or PackedSeq or np.array
+        sequence to encode, arrays being taken as codes of ALPHABET
+
+    Returns
+    -------
+    np.array
+        codes of the sequence, as np.uint8
+    str
+        character of each code
+    """
+    if isinstance(s, PackedSeq):
+        return s.unpack(), ALPHABET
+    if isinstance(s, np.ndarray):
+        return s.astype(np.uint8, copy=False), ALPHABET
+    raw = np.frombuffer(s.encode("latin-1"), dtype=np.uint8)
+    codes = _CODES[raw]
+    if not (codes == 255).any():
+        return codes, ALPHABET
+    alphabet, codes = np.unique(raw, return_inverse=True)
+    return codes.astype(np.uint8), alphabet.tobytes().decode("latin-1")
+
+
+def terminated(s):
+    """
+    Encode a sequence ending with a unique "$" sentinel of code 0
+
+    Parameters
+    ----------
+    s : str or PackedSeq or np.array
+        sequence to encode, a sentinel is appended if missing
+
+    Returns
+    -------
+    np.array
+        codes of the sequence, as np.uint8
+    str
+        character of each code
+    """
+    if isinstance(s, str) and s.endswith("$"):
+        s = s[:-1]
+    codes, alphabet = as_codes(s)
+    if alphabet == ALPHABET:
+        if len(codes) and codes[-1] == 0:
+            return codes, alphabet
+        return np.append(codes, np.uint8(0)), alphabet
+    return np.append(codes + 1, np.uint8(0)).astype(np.uint8), "$" + alphabet
+
+
+def pack(s, alphabet=ALPHABET):
+    """
+    Pack a DNA sequence on 2 bits per base
+
+    Parameters
+    ----------
+    s : str or np.array
+        DNA string or codes
+    alphabet : str
+        character of each code, when s is an array
+
+    Returns
+    -------
+    PackedSeq
+        packed sequence
+    """
+    if isinstance(s, str):
+        return PackedSeq.from_codes(encode(s))
+    if alphabet != ALPHABET:
+        return PackedSeq.from_codes(encode(decode(s, alphabet)))
+    return PackedSeq.from_codes(np.asarray(s, dtype=np.uint8))
+
+
+def pack_transform(b):
+    """
+    Pack the transformed string of a transform object on 2 bits per base
+
+    This is a copy: the transforms work on, and keep, one byte per code, so
+    packing only saves memory once the object is dropped.
+
+    Parameters
+    ----------
+    b : bwt, bwts, isbwt or sabwt
+        transform object, already transformed
+
+    Returns
+    -------
+    PackedSeq
+        packed transformed string
+    """
+    return pack(b.transformed, getattr(b, "alphabet", ALPHABET))
+
+
+class PackedSeq:
+    """
+    DNA sequence packed on 2 bits per base
+
+    A, C, G and T are packed four per byte, most significant bits first.
+    The rare N and "$" are kept aside as sorted exception positions.
+
+    Parameters
+    ----------
+    data : np.array or buffer
+        packed bytes, used without copy
+    length : int
+        number of bases
+    exceptions : np.array
+        sorted positions of the N and "$" bases
+    values : np.array
+        codes of the exceptions
+
+    Attributes
+    ----------
+    data : np.array
+        packed bytes
+    length : int
+        number of bases
+    exceptions : np.array
+        sorted positions of the N and "$" bases
+    values : np.array
+        codes of the exceptions
+
+    Methods
+    -------
+    from_codes(codes)
+        pack integer codes
+    unpack(start, stop)
+        codes of a range of bases
+    view(start, stop)
+        packed sequence sharing the bytes of a range of bases
+    """
+
+    def __init__(self, data, length, exceptions=None, values=None):
+        self.data = np.frombuffer(data, dtype=np.uint8)
+        self.length = length
+        if exceptions is None:
+            exceptions = np.empty(0, dtype=np.int64)
+            values = np.empty(0, dtype=np.uint8)
+        self.exceptions = np.asarray(exceptions, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.uint8)
+
+    @classmethod
+    def from_codes(cls, codes):
+        """
+        Pack codes of ALPHABET
+
+        Parameters
+        ----------
+        codes : np.array
+            codes to pack
+
+        Returns
+        -------
+        PackedSeq
+            packed sequence
+        """
+        n = len(codes)
+        two = np.zeros((n + 3) // 4 * 4, dtype=np.uint8)
+        two[:n] = _TWO_BITS[codes]
+        data = np.bitwise_or.reduce(two.reshape(-1, 4) << _SHIFTS, axis=1)
+        exceptions = np.flatnonzero(_EXCEPTIONS[codes])
+        return cls(data.astype(np.uint8), n, exceptions, codes[exceptions])
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return decode(self.unpack())
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.exceptions.nbytes + self.values.nbytes
+
+    def unpack(self, start=0, stop=None):
+        """
+        Unpack a range of bases into codes of ALPHABET
+
+        Parameters
+        ----------
+        start : int
+            first base
+        stop : int, optional
+            base following the last one, defaults to the end
+
+        Returns
+        -------
+        np.array
+            codes of the bases, as np.uint8
+        """
+        stop = self.length if stop is None else min(stop, self.length)
+        if start >= stop:
+            return np.empty(0, dtype=np.uint8)
+        block = self.data[start // 4 : (stop + 3) // 4]
+        two = (block[:, None] >> _SHIFTS) & 3
+        codes = _FROM_TWO_BITS[two.ravel()[start % 4 : start % 4 + stop - start]]
+        lo, hi = np.searchsorted(self.exceptions, [start, stop])
+        codes[self.exceptions[lo:hi] - start] = self.values[lo:hi]
+        return codes
+
+    def view(self, start=0, stop=None):
+        """
+        Packed sequence of a range of bases, sharing the packed bytes
+
+        Parameters
+        ----------
+        start : int
+            first base, a multiple of 4
+        stop : int, optional
+            base following the last one, defaults to the end
+
+        Returns
+        -------
+        PackedSeq
+            zero-copy view of the range
+        """
+        if start % 4:
+            raise ValueError("views must start on a byte boundary")
+        stop = self.length if stop is None else min(stop, self.length)
+        lo, hi = np.searchsorted(self.exceptions, [start, stop])
+        return PackedSeq(
+            self.data[start // 4 : (stop + 3) // 4],
+            max(stop - start, 0),
+            self.exceptions[lo:hi] - start,
+            self.values[lo:hi],
+        )
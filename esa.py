@@ -0,0 +1,452 @@
+import numpy as np
+
+from fmindex import FMIndex
+
+
+def lcp_array(t, sa):
+    """
+    Calculate the longest common prefix array with the Phi algorithm
+
+    The LCP of each suffix with the one preceding it in the suffix array is
+    computed in text order, where it drops by at most one from a suffix to
+    the next, so characters are compared O(n) times in total.
+
+    Parameters
+    ----------
+    t : np.array
+        integer text, ending with a unique smallest sentinel
+    sa : np.array
+        suffix array of the text
+
+    Returns
+    -------
+    np.array
+        longest common prefix of each suffix array row with the previous
+        one, 0 for the first row, as np.int64
+    """
+    n = len(sa)
+    sa = np.asarray(sa, dtype=np.int64)
+    # suffix preceding each suffix in the suffix array, -1 for the first
+    phi = np.full(n, -1, dtype=np.int64)
+    phi[sa[1:]] = sa[:-1]
+    plcp = np.zeros(n, dtype=np.int64)
+    T, P, L = memoryview(np.ascontiguousarray(t)), memoryview(phi), memoryview(plcp)
+    h = 0
+    for i in range(n):
+        j = P[i]
+        if j < 0:
+            h = 0
+            continue
+        # the sentinel is unique, so the comparison stops before the end
+        while T[i + h] == T[j + h]:
+            h += 1
+        L[i] = h
+        if h:
+            h -= 1
+    return plcp[sa]
+
+
+def child_table(lcp):
+    """
+    Calculate the child table of an enhanced suffix array
+
+    Parameters
+    ----------
+    lcp : np.array
+        LCP array padded with -1 at both ends, so that entry i is the LCP
+        of rows i - 1 and i for 0 < i < n
+
+    Returns
+    -------
+    np.array
+        up values, first l-index of the interval ending before each index
+    np.array
+        down values, first l-index of the interval starting at each index
+    np.array
+        next l-index of the same interval after each l-index
+    """
+    size = len(lcp)
+    up = np.zeros(size, dtype=np.int64)
+    down = np.zeros(size, dtype=np.int64)
+    nextl = np.zeros(size, dtype=np.int64)
+    L, U, D, N = memoryview(lcp), memoryview(up), memoryview(down), memoryview(nextl)
+
+    # 0 marks undefined entries, index 0 never being an l-index
+    stack, last = [0], -1
+    for i in range(1, size):
+        while L[i] < L[stack[-1]]:
+            last = stack.pop()
+            top = stack[-1]
+            if L[i] <= L[top] and L[top] != L[last]:
+                D[top] = last
+        if last != -1:
+            U[i] = last
+            last = -1
+        stack.append(i)
+
+    stack = [0]
+    for i in range(1, size):
+        while L[i] < L[stack[-1]]:
+            stack.pop()
+        if L[i] == L[stack[-1]]:
+            N[stack.pop()] = i
+        stack.append(i)
+    return up, down, nextl
+
+
+def smaller_values(lcp):
+    """
+    Find the nearest smaller LCP values on both sides of each index
+
+    Parameters
+    ----------
+    lcp : np.array
+        LCP array padded with -1 at both ends
+
+    Returns
+    -------
+    np.array
+        largest index before each index holding a smaller value, 0 when
+        there is none
+    np.array
+        smallest index after each index holding a smaller value, the last
+        index when there is none
+    """
+    size = len(lcp)
+    psv = np.zeros(size, dtype=np.int64)
+    nsv = np.full(size, size - 1, dtype=np.int64)
+    L, P, N = memoryview(lcp), memoryview(psv), memoryview(nsv)
+    stack = [0]
+    for i in range(1, size):
+        while L[i] < L[stack[-1]]:
+            N[stack.pop()] = i
+        # equal values share the smaller value preceding the first of them
+        top = stack[-1]
+        P[i] = P[top] if L[top] == L[i] else top
+        stack.append(i)
+    return psv, nsv
+
+
+class EnhancedSA:
+    """
+    Enhanced suffix array: suffix array, LCP array and child table, with a
+    BWT index over the same rows for maximal exact match seeding
+
+    An lcp-interval is given as a half-open range of rows [lb, rb), like
+    the intervals of backward search, its depth being the length of the
+    prefix shared by its suffixes. The child table walks these intervals
+    top-down, and the nearest smaller LCP values give their parents.
+
+    Attributes
+    ----------
+    text : np.array
+        integer text, ending with a unique smallest sentinel
+    alphabet : str
+        character of each code
+    sa : np.array
+        suffix array
+    lcp : np.array
+        LCP array padded with -1 at both ends
+    up, down, nextl : np.array
+        child table
+    psv, nsv : np.array
+        previous and next smaller LCP values
+    index : FMIndex
+        BWT index over the same rows, used to extend matches leftwards,
+        without suffix array samples: positions come from sa
+
+    Methods
+    -------
+    from_transform(b)
+        build the enhanced suffix array from a sabwt or isbwt object
+    depth(lb, rb)
+        length of the prefix shared by an interval
+    children(lb, rb)
+        child intervals of an lcp-interval
+    parent(lb, rb)
+        enclosing lcp-interval of smaller depth
+    find(pattern)
+        interval of the pattern, searched top-down
+    matching_statistics(read)
+        longest match starting at each read position
+    smems(read, min_length)
+        super-maximal exact matches of a read
+    locate(lb, rb)
+        text positions of an interval
+    nbytes()
+        memory footprint
+    """
+
+    def __init__(self, text, sa, alphabet, occ_rate=64):
+        self.text = np.asarray(text)
+        self.alphabet = alphabet
+        self.sa = np.asarray(sa, dtype=np.int64)
+        n = len(self.sa)
+        self.lcp = np.append(lcp_array(self.text, self.sa), -1)
+        self.lcp[0] = -1
+        self.up, self.down, self.nextl = child_table(self.lcp)
+        self.psv, self.nsv = smaller_values(self.lcp)
+        # the suffix array is kept whole here, so the BWT index, only used
+        # for LF-mapping, samples none of it
+        bwt = self.text[self.sa - 1]
+        self.index = FMIndex(bwt, self.sa[:0], occ_rate, n, alphabet)
+
+    @classmethod
+    def from_transform(cls, b, occ_rate=64):
+        """
+        Build the enhanced suffix array from a sabwt or isbwt object
+
+        Parameters
+        ----------
+        b : sabwt or isbwt
+            transform object, transformed if not already done
+        occ_rate : int
+            distance between two occurrence checkpoints of the BWT index
+
+        Returns
+        -------
+        EnhancedSA
+            enhanced suffix array of the text
+        """
+        if len(b.transformed) == 0:
+            b.transform()
+        return cls(b.s, b.SA, b.alphabet, occ_rate)
+
+    def __len__(self):
+        return len(self.sa)
+
+    def _first_lindex(self, lb, rb):
+        # first index of an lcp-interval holding its depth as LCP value
+        if lb < self.up[rb] < rb:
+            return int(self.up[rb])
+        return int(self.down[lb])
+
+    def depth(self, lb, rb):
+        """
+        Length of the prefix shared by the suffixes of an interval
+
+        Parameters
+        ----------
+        lb, rb : int
+            lcp-interval, or a single row
+
+        Returns
+        -------
+        int
+            depth of the interval, the suffix length for a single row
+        """
+        if rb - lb == 1:
+            return len(self.sa) - int(self.sa[lb])
+        return int(self.lcp[self._first_lindex(lb, rb)])
+
+    def children(self, lb, rb):
+        """
+        Child intervals of an lcp-interval, in suffix array order
+
+        Parameters
+        ----------
+        lb, rb : int
+            lcp-interval
+
+        Returns
+        -------
+        list
+            (lb, rb) child intervals, empty for a single row
+        """
+        if rb - lb <= 1:
+            return []
+        i = self._first_lindex(lb, rb)
+        intervals = [(lb, i)]
+        while self.nextl[i] and self.nextl[i] < rb:
+            j = int(self.nextl[i])
+            intervals.append((i, j))
+            i = j
+        intervals.append((i, rb))
+        return intervals
+
+    def parent(self, lb, rb):
+        """
+        Enclosing lcp-interval of an interval, at the larger LCP value of
+        its boundaries
+
+        Parameters
+        ----------
+        lb, rb : int
+            interval of the suffixes prefixed by a string, other than the
+            whole suffix array
+
+        Returns
+        -------
+        tuple
+            (lb, rb) parent interval and its depth
+        """
+        left, right = int(self.lcp[lb]), int(self.lcp[rb])
+        ell = max(left, right)
+        if left == ell:
+            lb = int(self.psv[lb])
+        if right == ell:
+            rb = int(self.nsv[rb])
+        return lb, rb, ell
+
+    def find(self, pattern):
+        """
+        Find the interval of the suffixes prefixed by a pattern, descending
+        the child table from the root
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to search
+
+        Returns
+        -------
+        tuple
+            half-open interval [lb, rb), empty if lb >= rb
+        """
+        codes = self.index.encode(pattern)
+        if codes is None:
+            return 0, 0
+        codes = np.array(codes, dtype=self.text.dtype)
+        m = len(codes)
+        lb, rb, matched = 0, len(self.sa), 0
+        while True:
+            start = int(self.sa[lb])
+            stop = min(self.depth(lb, rb), m)
+            if not np.array_equal(
+                self.text[start + matched : start + stop], codes[matched:stop]
+            ):
+                return 0, 0
+            if stop == m:
+                return lb, rb
+            matched = stop
+            for child in self.children(lb, rb):
+                if self.text[self.sa[child[0]] + matched] == codes[matched]:
+                    lb, rb = child
+                    break
+            else:
+                return 0, 0
+
+    def matching_statistics(self, read):
+        """
+        Length and interval of the longest prefix of each read suffix that
+        occurs in the text
+
+        The read is matched backwards with the BWT. When a character cannot
+        extend the current match, the match is shortened to the parent
+        lcp-interval rather than restarted, so the work is linear in the
+        read length.
+
+        Parameters
+        ----------
+        read : str
+            read sequence
+
+        Returns
+        -------
+        np.array
+            match length at each read position
+        np.array
+            (lb, rb) interval of each match, as rows of an (m, 2) array
+        """
+        m, n = len(read), len(self.sa)
+        lengths = np.zeros(m, dtype=np.int64)
+        intervals = np.zeros((m, 2), dtype=np.int64)
+        lb, rb, q = 0, n, 0
+        for i in range(m - 1, -1, -1):
+            c = self.index.code.get(read[i], -1)
+            while True:
+                if c < 0:
+                    lb, rb, q = 0, n, 0
+                    break
+                sp, ep = self.index.lf(c, lb), self.index.lf(c, rb)
+                if sp < ep:
+                    lb, rb, q = sp, ep, q + 1
+                    break
+                if q == 0:
+                    break
+                lb, rb, q = self.parent(lb, rb)
+            lengths[i] = q
+            intervals[i] = lb, rb
+        return lengths, intervals
+
+    def smems(self, read, min_length=19):
+        """
+        Find the super-maximal exact matches of a read, matches that cannot
+        be extended on either side and are not contained in another one
+
+        The match at a read position is contained in the previous one
+        exactly when it is one character shorter, so the others are kept.
+
+        Parameters
+        ----------
+        read : str
+            read sequence
+        min_length : int
+            shorter matches are discarded
+
+        Returns
+        -------
+        list
+            (offset, length, (lb, rb)) of each match, by read offset
+        """
+        lengths, intervals = self.matching_statistics(read)
+        found = []
+        for i, q in enumerate(lengths.tolist()):
+            if q < min_length or (i and q < lengths[i - 1]):
+                continue
+            found.append((i, q, tuple(intervals[i].tolist())))
+        return found
+
+    def locate(self, lb, rb):
+        """
+        Text positions of the suffixes of an interval
+
+        Parameters
+        ----------
+        lb, rb : int
+            interval
+
+        Returns
+        -------
+        np.array
+            sorted positions
+        """
+        return np.sort(self.sa[lb:rb])
+
+    def nbytes(self):
+        """
+        Memory footprint of the arrays
+
+        Returns
+        -------
+        int
+            size in bytes
+        """
+        arrays = (self.sa, self.lcp, self.up, self.down, self.nextl)
+        return (
+            sum(a.nbytes for a in arrays)
+            + self.psv.nbytes
+            + self.nsv.nbytes
+            + self.index.nbytes()
+        )
+
+
+if __name__ == "__main__":
+    from random import choice, randrange, seed
+
+    import isbwt
+
+    seed(0)
+    genome = "".join(choice("ACGT") for _ in range(20000))
+    esa = EnhancedSA.from_transform(isbwt.isbwt(genome))
+
+    start = randrange(len(genome) - 100)
+    read = list(genome[start : start + 100])
+    for offset in (30, 70):
+        read[offset] = choice("ACGT".replace(read[offset], ""))
+    read = "".join(read)
+
+    kmers = [read[o : o + 15] for o in range(0, 86, 5)]
+    print(f"{sum(esa.index.count(k) > 0 for k in kmers)} 15-mer seeds with hits")
+    for offset, length, (lb, rb) in esa.smems(read):
+        print(f"SMEM at {offset}, length {length}: {esa.locate(lb, rb) - offset}")
@@ -0,0 +1,353 @@
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+import encoding
+import seqio
+
+# working memory of a block sort, per suffix: positions, labels, keys and
+# the temporaries of sorting them
+BYTES_PER_SUFFIX = 48
+
+DEFAULT_BUDGET = 1 << 30
+
+parser = argparse.ArgumentParser(
+    description="build the suffix array and BWT of a reference on disk"
+)
+parser.add_argument("reference", help="FASTA reference, plain, gzip or tar")
+parser.add_argument("prefix", help="prefix of the .txt, .sa and .bwt output files")
+parser.add_argument(
+    "-b",
+    "--budget",
+    default="1G",
+    help="memory budget, in bytes or with a K, M or G suffix",
+)
+
+
+def parse_size(size):
+    """
+    Parse a size in bytes, such as 512M or 2G
+
+    Parameters
+    ----------
+    size : str
+        number of bytes, with an optional K, M or G suffix
+
+    Returns
+    -------
+    int
+        size in bytes
+    """
+    size = size.strip().upper()
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def write_text(path, out):
+    """
+    Encode the records of a FASTA file to a file of ALPHABET codes, one
+    record at a time, records being separated by N and followed by "$"
+
+    Parameters
+    ----------
+    path : str
+        FASTA file, plain, gzip or tar archived
+    out : str
+        output file
+
+    Returns
+    -------
+    np.memmap
+        codes of the text
+    """
+    with open(out, "wb") as handle:
+        for i, (_, seq) in enumerate(seqio.read_sequences(path)):
+            if i:
+                handle.write(bytes([encoding.N_CODE]))
+            encoding.encode(seq.upper()).tofile(handle)
+        handle.write(bytes([0]))
+    return np.memmap(out, dtype=np.uint8, mode="r")
+
+
+def prefix_keys(text, positions, offset, width, bits):
+    """
+    Pack the characters following some text positions into 64-bit keys
+
+    Parameters
+    ----------
+    text : np.array
+        integer text, possibly memory-mapped
+    positions : np.array
+        suffix starts
+    offset : int
+        first character packed, relative to the suffix starts
+    width : int
+        number of characters packed
+    bits : int
+        bits per character
+
+    Returns
+    -------
+    np.array
+        np.uint64 keys, characters past the end of the text counting as 0
+    """
+    n = len(text)
+    keys = np.zeros(len(positions), dtype=np.uint64)
+    for j in range(width):
+        at = positions + (offset + j)
+        inside = at < n
+        c = np.zeros(len(positions), dtype=np.uint64)
+        c[inside] = text[at[inside]]
+        keys = (keys << np.uint64(bits)) | c
+    return keys
+
+
+def next_head(bounds, i):
+    """
+    Find the first group start at or after a row
+
+    Parameters
+    ----------
+    bounds : np.array
+        boolean flags of the rows starting a group, possibly memory-mapped
+    i : int
+        first row looked at
+
+    Returns
+    -------
+    int
+        row of the next group start, len(bounds) if there is none
+    """
+    n, step = len(bounds), 1 << 20
+    while i < n:
+        ahead = np.flatnonzero(bounds[i : i + step])
+        if len(ahead):
+            return i + int(ahead[0])
+        i += step
+    return n
+
+
+def sort_block(text, sa, rank, bounds, lo, hi, bits):
+    """
+    Sort the rows of a block by the first characters of their suffixes,
+    marking the groups they leave tied and ranking each suffix by the first
+    row of its group
+
+    Parameters
+    ----------
+    text : np.array
+        integer text, possibly memory-mapped
+    sa : np.array
+        suffix array being built, possibly memory-mapped
+    rank : np.array
+        rank of each text position, possibly memory-mapped
+    bounds : np.array
+        boolean flags of the rows starting a group, possibly memory-mapped
+    lo, hi : int
+        rows of the block, every suffix sharing its first characters with
+        one of the block being in it
+    bits : int
+        bits per character
+    """
+    pos = np.asarray(sa[lo:hi], dtype=np.int64)
+    keys = prefix_keys(text, pos, 0, 64 // bits, bits)
+    order = np.argsort(keys, kind="stable")
+    pos, keys = pos[order], keys[order]
+    heads = np.ones(len(pos), dtype=bool)
+    heads[1:] = keys[1:] != keys[:-1]
+    sa[lo:hi] = pos
+    bounds[lo:hi] = heads
+    rows = np.arange(lo, hi, dtype=np.int64)
+    rank[pos] = np.maximum.accumulate(np.where(heads, rows, lo))
+
+
+def refine(sa, rank, bounds, lo, hi, h):
+    """
+    Sort the tied rows of a block by the rank of the suffix h characters
+    further, splitting their groups where these ranks differ
+
+    Ranks are updated in place. A rank read after its group was split
+    still orders suffixes correctly, being the first row of a group of
+    suffixes sharing at least h characters.
+
+    Parameters
+    ----------
+    sa : np.array
+        suffix array being built, possibly memory-mapped
+    rank : np.array
+        rank of each text position, possibly memory-mapped
+    bounds : np.array
+        boolean flags of the rows starting a group, possibly memory-mapped
+    lo, hi : int
+        rows of the block, starting a group and ending one
+    h : int
+        number of characters the suffixes of a group share
+
+    Returns
+    -------
+    int
+        number of rows that were tied
+    """
+    heads = np.asarray(bounds[lo:hi])
+    groups = np.cumsum(heads) - 1
+    tied = np.bincount(groups)[groups] > 1
+    idx = np.flatnonzero(tied)
+    if len(idx) == 0:
+        return 0
+    rows = lo + idx
+    # tied suffixes share h characters, none of them the sentinel, so
+    # every position h characters further is inside the text
+    pos = np.asarray(sa[rows], dtype=np.int64)
+    keys = np.asarray(rank[pos + h], dtype=np.int64)
+    groups = groups[idx]
+    order = np.lexsort((keys, groups))
+    pos, keys, groups = pos[order], keys[order], groups[order]
+    split = np.ones(len(idx), dtype=bool)
+    split[1:] = (keys[1:] != keys[:-1]) | (groups[1:] != groups[:-1])
+    sa[rows] = pos
+    bounds[rows] = split
+    rank[pos] = np.maximum.accumulate(np.where(split, rows, lo))
+    return len(idx)
+
+
+def suffix_array(text, path, budget=DEFAULT_BUDGET, sigma=None):
+    """
+    Suffix array construction on disk, within a memory budget
+
+    Sample suffixes give splitter keys cutting the suffixes into blocks that
+    fit the budget. One pass over the text counts the suffixes of each
+    block, a second one scatters their positions to their block in the
+    output file, then every block is sorted in memory by the key of the
+    first characters of its suffixes and written back in place.
+
+    Suffixes sharing these characters are then refined by prefix doubling:
+    each round sorts them by the rank of the suffix h characters further,
+    ranks and group starts being kept in temporary files next to the
+    output, and doubles h. Every round is a pass over the rows by blocks,
+    so a text with long repeats takes O(log n) passes rather than
+    comparing its repeats character by character.
+
+    Blocks never split a group of suffixes sharing their first characters,
+    so a large group, such as the suffixes of a long run of N in the first
+    rounds, is sorted in memory at once and may exceed the budget.
+
+    Parameters
+    ----------
+    text : np.array
+        integer text ending with a unique smallest sentinel, possibly
+        memory-mapped
+    path : str or file
+        output file of the suffix array
+    budget : int
+        memory budget, in bytes
+    sigma : int, optional
+        alphabet size, defaults to max(text) + 1
+
+    Returns
+    -------
+    np.memmap
+        suffix array of the text
+    """
+    n = len(text)
+    if sigma is None:
+        sigma = int(text.max()) + 1
+    bits = max(1, int(sigma - 1).bit_length())
+    width = 64 // bits
+    dtype = encoding.index_dtype(n)
+    sa = np.memmap(path, dtype=dtype, mode="w+", shape=(n,))
+    block = max(1, budget // BYTES_PER_SUFFIX)
+    chunks = range(0, n, block)
+
+    rng = np.random.default_rng(0)
+    n_blocks = -(-n // block)
+    sample = rng.integers(0, n, size=min(n, 64 * n_blocks))
+    splitters = np.unique(prefix_keys(text, sample, 0, width, bits))
+    splitters = splitters[:: max(1, len(splitters) // n_blocks)][1:]
+
+    counts = np.zeros(len(splitters) + 1, dtype=np.int64)
+    for start in chunks:
+        positions = np.arange(start, min(start + block, n), dtype=np.int64)
+        keys = prefix_keys(text, positions, 0, width, bits)
+        buckets = np.searchsorted(splitters, keys, side="right")
+        counts += np.bincount(buckets, minlength=len(counts))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    cursor = offsets[:-1].copy()
+    for start in chunks:
+        positions = np.arange(start, min(start + block, n), dtype=np.int64)
+        keys = prefix_keys(text, positions, 0, width, bits)
+        buckets = np.searchsorted(splitters, keys, side="right")
+        order = np.argsort(buckets, kind="stable")
+        buckets = buckets[order]
+        sizes = np.bincount(buckets, minlength=len(counts))
+        first = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        dest = cursor[buckets] + np.arange(len(buckets)) - first[buckets]
+        sa[dest] = positions[order]
+        cursor += sizes
+
+    workdir = os.path.dirname(os.path.abspath(path)) if isinstance(path, str) else None
+    rank_file = tempfile.TemporaryFile(dir=workdir)
+    bounds_file = tempfile.TemporaryFile(dir=workdir)
+    with rank_file, bounds_file:
+        rank = np.memmap(rank_file, dtype=dtype, mode="w+", shape=(n,))
+        bounds = np.memmap(bounds_file, dtype=bool, mode="w+", shape=(n,))
+        for lo, hi in zip(offsets[:-1], offsets[1:]):
+            if hi > lo:
+                sort_block(text, sa, rank, bounds, lo, hi, bits)
+        h = width
+        while True:
+            tied, lo = 0, 0
+            while lo < n:
+                hi = next_head(bounds, min(lo + block, n))
+                tied += refine(sa, rank, bounds, lo, hi, h)
+                lo = hi
+            if not tied:
+                break
+            h *= 2
+        del rank, bounds
+    sa.flush()
+    return sa
+
+
+def transform(text, sa, path, budget=DEFAULT_BUDGET):
+    """
+    Write the Burrows-Wheeler transform of a text from its suffix array,
+    one block at a time
+
+    Parameters
+    ----------
+    text : np.array
+        integer text, possibly memory-mapped
+    sa : np.array
+        suffix array of the text, possibly memory-mapped
+    path : str or file
+        output file of the transform
+    budget : int
+        memory budget, in bytes
+
+    Returns
+    -------
+    np.memmap
+        codes of the transformed text
+    """
+    n = len(text)
+    out = np.memmap(path, dtype=text.dtype, mode="w+", shape=(n,))
+    block = max(1, budget // 16)
+    for start in range(0, n, block):
+        rows = np.asarray(sa[start : start + block], dtype=np.int64)
+        out[start : start + len(rows)] = text[rows - 1]
+    out.flush()
+    return out
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    budget = parse_size(args.budget)
+    text = write_text(args.reference, args.prefix + ".txt")
+    sa = suffix_array(text, args.prefix + ".sa", budget, len(encoding.ALPHABET))
+    transform(text, sa, args.prefix + ".bwt", budget)
+    print(f"{len(text)} characters, {os.path.getsize(args.prefix + '.sa')} bytes SA")
@@ -0,0 +1,613 @@
+import numpy as np
+
+import encoding
+from wavelet import WaveletMatrix
+
+# (occ_rate, sa_rate, rank) triples, from full tables to sparse samples;
+# "small" keeps the BWT in a wavelet matrix instead of a byte per base, for
+# about 4.7 bits per base on DNA against 17 for "balanced"
+PRESETS = {
+    "fast": (1, 1, "occ"),
+    "balanced": (64, 16, "occ"),
+    "small": (256, 64, "wavelet"),
+}
+
+# arrays holding the index, everything else being small scalars; "bwt" is
+# left out with a wavelet matrix, which gives back its characters
+ARRAYS = ("bwt", "C", "occ", "sa_rows", "sa_samples", "isa_samples")
+
+# rank structures, occurrence checkpoints or a wavelet matrix
+RANKS = ("occ", "wavelet")
+
+
+class FMIndex:
+    """
+    FM-index over a Burrows-Wheeler transformed string
+
+    Parameters
+    ----------
+    transformed : np.array or str
+        transformed string, containing a single "$" sentinel, or its
+        integer codes when an alphabet is given
+    sa : np.array
+        suffix array the transform was extracted from
+    occ_rate : int
+        distance between two occurrence checkpoints
+    sa_rate : int
+        distance between two sampled text positions
+    alphabet : str, optional
+        character of each code of an integer coded transform
+    rank : str
+        rank structure, one of RANKS: "occ" checkpoints count every code and
+        take sigma integers per checkpoint, the "wavelet" matrix answers in
+        O(log sigma) bitvector ranks for large alphabets
+
+    Attributes
+    ----------
+    alphabet : np.array
+        sorted alphabet of the transformed string, sentinel included
+    code : dict
+        code of each character of the alphabet
+    bwt : np.array or None
+        integer codes of the transformed string, None with a wavelet matrix
+    C : np.array
+        number of characters smaller than each code in the text
+    occ : np.array
+        occurrences of each code before every checkpoint, empty with a
+        wavelet matrix
+    wavelet : WaveletMatrix or None
+        wavelet matrix of the transformed string, if used for ranks
+    sa_rows : np.array
+        sorted rows of the sampled suffixes
+    sa_samples : np.array
+        text positions of the sampled suffixes
+    isa_samples : np.array
+        rows of the sampled suffixes, in text order, entry k being the row
+        of the suffix at position k * sa_rate
+
+    Methods
+    -------
+    from_transform(b, preset, rank)
+        build the index from a sabwt or isbwt object
+    from_arrays(alphabet, occ_rate, sa_rate, arrays)
+        wrap existing index arrays without copying them
+    arrays()
+        arrays holding the index
+    access(i)
+        code of the transformed character at position i
+    rank(c, i)
+        number of occurrences of code c in the first i characters
+    lf(c, i)
+        last-to-first mapping of code c at position i
+    encode(pattern)
+        encode a pattern with the alphabet codes
+    backward_search(pattern)
+        interval of the suffix array prefixed by the pattern
+    encode_batch(patterns)
+        codes of equal-length patterns, one row per pattern
+    rank_batch(c, i)
+        ranks of many codes at many positions at once
+    backward_search_batch(codes)
+        intervals of many patterns, searched in lockstep
+    count(pattern)
+        number of occurrences of the pattern
+    resolve(row)
+        text position of a suffix array row
+    locate(pattern)
+        positions of the pattern in the original string
+    locate_interval(sp, ep)
+        positions of the suffixes of an interval
+    anchor(end)
+        nearest sampled suffix at or after a text position
+    extract(start, end)
+        substring of the original string
+    nbytes()
+        memory footprint of the index
+    """
+
+    def __init__(
+        self, transformed, sa, occ_rate=64, sa_rate=16, alphabet=None, rank="occ"
+    ):
+        if rank not in RANKS:
+            raise ValueError(f"unknown rank structure: {rank}")
+        if alphabet is None:
+            if isinstance(transformed, str):
+                transformed = list(transformed)
+            alphabet, transformed = np.unique(transformed, return_inverse=True)
+        self.alphabet = np.array(list(alphabet))
+        self.code = {str(c): i for i, c in enumerate(self.alphabet)}
+        dtype = np.uint8 if len(self.alphabet) <= 256 else np.int32
+        self.bwt = np.asarray(transformed).astype(dtype)
+        counts = np.bincount(self.bwt, minlength=len(self.alphabet))
+        self.C = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.occ_rate = occ_rate
+        if rank == "wavelet":
+            self.wavelet = WaveletMatrix(self.bwt, len(self.alphabet))
+            self.occ = np.zeros((0, len(self.alphabet)), dtype=np.uint32)
+            self.bwt = None
+        else:
+            self.wavelet = None
+            self.occ = self.occurrences()
+        self.sa_rate = sa_rate
+        self.sa_rows, self.sa_samples = self.sample_sa(np.asarray(sa))
+        self.isa_samples = self.sa_rows[np.argsort(self.sa_samples)]
+
+    @classmethod
+    def from_transform(cls, b, preset="balanced", rank=None):
+        """
+        Build the index from a sabwt or isbwt object
+
+        Parameters
+        ----------
+        b : sabwt or isbwt
+            transform object, transformed if not already done
+        preset : str
+            sampling rates and rank structure, one of PRESETS
+        rank : str, optional
+            rank structure, one of RANKS, overriding that of the preset
+
+        Returns
+        -------
+        FMIndex
+            index of the transformed string
+        """
+        if len(b.transformed) == 0:
+            b.transform()
+        occ_rate, sa_rate, preset_rank = PRESETS[preset]
+        rank = rank or preset_rank
+        return cls(b.transformed, b.SA, occ_rate, sa_rate, b.alphabet, rank)
+
+    @classmethod
+    def from_arrays(cls, alphabet, occ_rate, sa_rate, arrays):
+        """
+        Wrap existing index arrays, such as shared or memory-mapped buffers,
+        without copying them
+
+        Parameters
+        ----------
+        alphabet : str
+            character of each code
+        occ_rate : int
+            distance between two occurrence checkpoints
+        sa_rate : int
+            distance between two sampled text positions
+        arrays : dict
+            index arrays, by name as listed in ARRAYS, plus those of a
+            wavelet matrix, which replaces "bwt"
+
+        Returns
+        -------
+        FMIndex
+            index over the given arrays
+        """
+        index = cls.__new__(cls)
+        index.alphabet = np.array(list(alphabet))
+        index.code = {c: i for i, c in enumerate(alphabet)}
+        index.occ_rate = occ_rate
+        index.sa_rate = sa_rate
+        for name in ARRAYS:
+            setattr(index, name, arrays.get(name))
+        index.wavelet = None
+        if "wm_words" in arrays:
+            index.wavelet = WaveletMatrix.from_arrays(
+                arrays["wm_words"], arrays["wm_blocks"], arrays["wm_zeros"]
+            )
+        return index
+
+    def arrays(self):
+        """
+        Arrays holding the index
+
+        Returns
+        -------
+        dict
+            index arrays, by name
+        """
+        arrays = {name: getattr(self, name) for name in ARRAYS}
+        if self.bwt is None:
+            del arrays["bwt"]
+        if self.wavelet is not None:
+            arrays.update(self.wavelet.arrays())
+        return arrays
+
+    def __len__(self):
+        if self.bwt is None:
+            return len(self.wavelet)
+        return len(self.bwt)
+
+    def occurrences(self):
+        """
+        Calculate the occurrence checkpoints of every code
+
+        Returns
+        -------
+        np.array
+            (n // occ_rate + 1) x sigma table, row j counting the codes of
+            bwt[:j * occ_rate]
+        """
+        starts = np.arange(0, len(self.bwt), self.occ_rate)
+        occ = np.zeros((len(starts) + 1, len(self.alphabet)), dtype=np.uint32)
+        for c in range(len(self.alphabet)):
+            blocks = np.add.reduceat(self.bwt == c, starts, dtype=np.uint32)
+            np.cumsum(blocks, out=occ[1:, c])
+        return occ
+
+    def sample_sa(self, sa):
+        """
+        Keep the suffix array rows pointing to multiples of sa_rate
+
+        Parameters
+        ----------
+        sa : np.array
+            full suffix array
+
+        Returns
+        -------
+        np.array
+            sorted rows of the sampled suffixes
+        np.array
+            text positions of the sampled suffixes
+        """
+        rows = np.flatnonzero(sa % self.sa_rate == 0).astype(np.uint32)
+        return rows, sa[rows].astype(np.uint32)
+
+    def access(self, i):
+        """
+        Code of the transformed character at a position
+
+        Parameters
+        ----------
+        i : int
+            position in the transformed string
+
+        Returns
+        -------
+        int
+            character code
+        """
+        if self.bwt is None:
+            return self.wavelet.access(i)
+        return int(self.bwt[i])
+
+    def rank(self, c, i):
+        """
+        Number of occurrences of code c in the first i transformed characters
+
+        Parameters
+        ----------
+        c : int
+            character code
+        i : int
+            prefix length
+
+        Returns
+        -------
+        int
+            rank of c at position i
+        """
+        if self.wavelet is not None:
+            return self.wavelet.rank(c, i)
+        k = self.occ_rate
+        if k == 1:
+            return int(self.occ[i, c])
+        # count from the nearest checkpoint, forwards or backwards
+        j = min((i + k // 2) // k, len(self.occ) - 1)
+        b = j * k
+        if b <= i:
+            return int(self.occ[j, c]) + int(np.count_nonzero(self.bwt[b:i] == c))
+        return int(self.occ[j, c]) - int(np.count_nonzero(self.bwt[i:b] == c))
+
+    def lf(self, c, i):
+        """
+        Last-to-first mapping of code c at position i
+
+        Parameters
+        ----------
+        c : int
+            character code
+        i : int
+            position in the transformed string
+
+        Returns
+        -------
+        int
+            row of the sorted matrix starting with that occurrence of c
+        """
+        return int(self.C[c]) + self.rank(c, i)
+
+    def encode(self, pattern):
+        """
+        Encode a pattern with the alphabet codes
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to encode
+
+        Returns
+        -------
+        list or None
+            codes of the pattern, None if a character is not in the alphabet
+        """
+        try:
+            return [self.code[c] for c in pattern]
+        except KeyError:
+            return None
+
+    def backward_search(self, pattern):
+        """
+        Find the suffix array interval of the suffixes prefixed by the pattern
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to search
+
+        Returns
+        -------
+        tuple
+            half-open interval [sp, ep), empty if sp >= ep
+        """
+        codes = self.encode(pattern)
+        if codes is None:
+            return 0, 0
+        sp, ep = 0, len(self)
+        for c in reversed(codes):
+            sp, ep = self.lf(c, sp), self.lf(c, ep)
+            if sp >= ep:
+                return 0, 0
+        return sp, ep
+
+    def encode_batch(self, patterns):
+        """
+        Encode equal-length patterns with the alphabet codes
+
+        Parameters
+        ----------
+        patterns : list
+            patterns of the same length
+
+        Returns
+        -------
+        np.array
+            (len(patterns), length) np.uint8 codes, characters that are not
+            in the alphabet getting the code len(alphabet)
+        """
+        table = np.full(256, len(self.alphabet), dtype=np.uint8)
+        for c, i in self.code.items():
+            if ord(c) < 256:
+                table[ord(c)] = i
+        joined = "".join(patterns).encode("utf-32-le")
+        chars = np.frombuffer(joined, dtype=np.uint32)
+        codes = table[np.minimum(chars, 255)]
+        codes[chars > 255] = len(self.alphabet)
+        length = len(patterns[0]) if len(patterns) else 0
+        return codes.reshape(len(patterns), length)
+
+    def rank_batch(self, c, i):
+        """
+        Number of occurrences of each code in the prefix of matching length
+
+        Each rank is counted from the checkpoint preceding its position,
+        over a window of occ_rate characters masked past the position, so
+        that a whole batch takes a few array operations.
+
+        Parameters
+        ----------
+        c : np.array
+            character codes
+        i : np.array
+            prefix lengths
+
+        Returns
+        -------
+        np.array
+            rank of each code at its position, as np.int64
+        """
+        c = np.asarray(c, dtype=np.int64)
+        i = np.asarray(i, dtype=np.int64)
+        if self.wavelet is not None:
+            return self.wavelet.rank_batch(c, i)
+        k = self.occ_rate
+        j = i // k
+        ranks = self.occ[j, c].astype(np.int64)
+        if k == 1:
+            return ranks
+        window = (j * k)[:, None] + np.arange(k)
+        inside = window < i[:, None]
+        chars = self.bwt[np.minimum(window, len(self.bwt) - 1)]
+        return ranks + np.count_nonzero((chars == c[:, None]) & inside, axis=1)
+
+    def backward_search_batch(self, codes):
+        """
+        Find the suffix array intervals of many equal-length patterns
+
+        The intervals of all patterns are LF-mapped together, one column at
+        a time from the last one, and patterns whose interval becomes empty
+        are dropped from the following columns.
+
+        Parameters
+        ----------
+        codes : np.array
+            (k, length) codes of the patterns, as from encode_batch
+
+        Returns
+        -------
+        np.array
+            first row of each interval
+        np.array
+            row following the last one of each interval, both being 0 for
+            patterns that do not occur
+        """
+        codes = np.asarray(codes)
+        k, length = codes.shape
+        sp = np.zeros(k, dtype=np.int64)
+        ep = np.full(k, len(self), dtype=np.int64)
+        # characters outside of the alphabet never match
+        active = np.flatnonzero((codes < len(self.alphabet)).all(axis=1))
+        ep[np.setdiff1d(np.arange(k), active)] = 0
+        for col in range(length - 1, -1, -1):
+            if len(active) == 0:
+                break
+            c = codes[active, col].astype(np.int64)
+            s = self.C[c] + self.rank_batch(c, sp[active])
+            e = self.C[c] + self.rank_batch(c, ep[active])
+            found = s < e
+            sp[active] = np.where(found, s, 0)
+            ep[active] = np.where(found, e, 0)
+            active = active[found]
+        return sp, ep
+
+    def count(self, pattern):
+        """
+        Count the occurrences of the pattern
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to count
+
+        Returns
+        -------
+        int
+            number of occurrences
+        """
+        sp, ep = self.backward_search(pattern)
+        return ep - sp
+
+    def resolve(self, row):
+        """
+        Recover the text position of a suffix array row, LF-walking back to
+        the nearest sampled suffix
+
+        Parameters
+        ----------
+        row : int
+            row of the suffix array
+
+        Returns
+        -------
+        int
+            text position of the suffix
+        """
+        if len(self.sa_rows) == 0:
+            raise ValueError("the index holds no suffix array samples")
+        steps = 0
+        while True:
+            j = np.searchsorted(self.sa_rows, row)
+            if j < len(self.sa_rows) and self.sa_rows[j] == row:
+                return int(self.sa_samples[j]) + steps
+            row = self.lf(self.access(row), row)
+            steps += 1
+
+    def locate(self, pattern):
+        """
+        Locate the occurrences of the pattern
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to locate
+
+        Returns
+        -------
+        np.array
+            sorted start positions of the pattern in the original string
+        """
+        return self.locate_interval(*self.backward_search(pattern))
+
+    def locate_interval(self, sp, ep):
+        """
+        Locate the suffixes of a suffix array interval
+
+        Parameters
+        ----------
+        sp, ep : int
+            half-open interval of rows
+
+        Returns
+        -------
+        np.array
+            sorted text positions of the suffixes
+        """
+        positions = [self.resolve(row) for row in range(sp, ep)]
+        return np.sort(np.array(positions, dtype=np.int64))
+
+    def anchor(self, end):
+        """
+        Find the nearest suffix at or after a text position whose row is
+        known, from the inverse suffix array samples
+
+        Parameters
+        ----------
+        end : int
+            text position
+
+        Returns
+        -------
+        int
+            text position of the suffix
+        int
+            row of the suffix
+        """
+        k = -(-end // self.sa_rate)
+        if k < len(self.isa_samples):
+            return k * self.sa_rate, int(self.isa_samples[k])
+        # the sentinel suffix is the first row
+        return len(self) - 1, 0
+
+    def extract(self, start, end):
+        """
+        Extract a substring of the original string without inverting the
+        whole transform
+
+        The suffix array is LF-walked backwards from the nearest sample
+        following the substring, in O(end - start + sa_rate) steps.
+
+        Parameters
+        ----------
+        start : int
+            first position
+        end : int
+            position following the last one, capped by the string length
+
+        Returns
+        -------
+        str
+            original string between start and end
+        """
+        end = min(end, len(self) - 1)
+        if start >= end:
+            return ""
+        pos, row = self.anchor(end)
+        codes = np.empty(pos - start, dtype=np.int64)
+        for k in range(pos - start - 1, -1, -1):
+            c = self.access(row)
+            codes[k] = c
+            row = self.lf(c, row)
+        return encoding.decode(codes[: end - start], "".join(self.alphabet))
+
+    def nbytes(self):
+        """
+        Memory footprint of the index arrays
+
+        Returns
+        -------
+        int
+            size in bytes
+        """
+        return (
+            (self.bwt.nbytes if self.bwt is not None else 0)
+            + self.occ.nbytes
+            + self.sa_rows.nbytes
+            + self.sa_samples.nbytes
+            + self.isa_samples.nbytes
+            + (self.wavelet.nbytes if self.wavelet is not None else 0)
+        )
+
+
+if __name__ == "__main__":
+    import isbwt
+
+    fm = FMIndex.from_transform(isbwt.isbwt("mmiissiissiippii"))
+    print(fm.C, fm.count("ssi"), fm.locate("ssi"))
@@ -0,0 +1,149 @@
+import heapq
+
+import numpy as np
+
+# longest code, bounding the size of the decoding table
+MAX_LENGTH = 20
+
+
+def code_lengths(freqs, limit=MAX_LENGTH):
+    """
+    Calculate Huffman code lengths, limited to a maximum length
+
+    When the optimal code is too deep, frequencies are flattened and the
+    code recomputed, as bzip2 does.
+
+    Parameters
+    ----------
+    freqs : np.array
+        frequency of each symbol
+    limit : int
+        longest code allowed
+
+    Returns
+    -------
+    np.array
+        code length of each symbol, 0 for absent symbols, as np.uint8
+    """
+    freqs = np.asarray(freqs, dtype=np.int64)
+    used = np.flatnonzero(freqs)
+    lengths = np.zeros(len(freqs), dtype=np.uint8)
+    if len(used) == 1:
+        lengths[used] = 1
+    if len(used) <= 1:
+        return lengths
+    weights = freqs[used]
+    while True:
+        heap = [(w, i, [i]) for i, w in enumerate(weights.tolist())]
+        heapq.heapify(heap)
+        depth = np.zeros(len(used), dtype=np.int64)
+        while len(heap) > 1:
+            w1, i1, s1 = heapq.heappop(heap)
+            w2, i2, s2 = heapq.heappop(heap)
+            depth[s1 + s2] += 1
+            heapq.heappush(heap, (w1 + w2, min(i1, i2), s1 + s2))
+        if depth.max() <= limit:
+            lengths[used] = depth
+            return lengths
+        weights = weights // 2 + 1
+
+
+def canonical_codes(lengths):
+    """
+    Assign canonical codes from code lengths, shorter codes first and
+    symbols in increasing order within a length
+
+    Parameters
+    ----------
+    lengths : np.array
+        code length of each symbol
+
+    Returns
+    -------
+    np.array
+        code of each symbol, as np.uint64
+    """
+    codes = np.zeros(len(lengths), dtype=np.uint64)
+    code, previous = 0, 0
+    for s in np.lexsort((np.arange(len(lengths)), lengths)).tolist():
+        length = int(lengths[s])
+        if length == 0:
+            continue
+        code <<= length - previous
+        codes[s] = code
+        code += 1
+        previous = length
+    return codes
+
+
+def encode(symbols, lengths):
+    """
+    Huffman encode symbols into packed bits
+
+    Parameters
+    ----------
+    symbols : np.array
+        symbols to encode
+    lengths : np.array
+        code length of each symbol
+
+    Returns
+    -------
+    bytes
+        packed bits, most significant first
+    """
+    codes = canonical_codes(lengths)
+    size = lengths[symbols].astype(np.int64)
+    owner = np.repeat(np.arange(len(symbols)), size)
+    # bit j of a code of length l is bit l - 1 - j of its value
+    shift = np.repeat(np.cumsum(size), size) - np.arange(len(owner)) - 1
+    bits = (codes[symbols[owner]] >> shift.astype(np.uint64)) & np.uint64(1)
+    return np.packbits(bits.astype(np.uint8)).tobytes()
+
+
+def decode(payload, count, lengths):
+    """
+    Decode Huffman coded symbols with a lookup table indexed by the next
+    MAX_LENGTH bits
+
+    Parameters
+    ----------
+    payload : bytes
+        packed bits
+    count : int
+        number of symbols to decode
+    lengths : np.array
+        code length of each symbol
+
+    Returns
+    -------
+    np.array
+        decoded symbols, as np.int64
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    width = max(1, int(lengths.max()))
+    codes = canonical_codes(lengths).astype(np.int64)
+    table_symbol = np.zeros(1 << width, dtype=np.int64)
+    table_length = np.zeros(1 << width, dtype=np.int64)
+    for s in np.flatnonzero(lengths).tolist():
+        lo = int(codes[s]) << (width - lengths[s])
+        hi = (int(codes[s]) + 1) << (width - lengths[s])
+        table_symbol[lo:hi] = s
+        table_length[lo:hi] = lengths[s]
+
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8)).astype(np.int64)
+    bits = np.concatenate([bits, np.zeros(width, dtype=np.int64)])
+    # next width bits at every bit position
+    windows = np.zeros(len(bits) - width + 1, dtype=np.int64)
+    for j in range(width):
+        windows = (windows << 1) | bits[j : j + len(windows)]
+
+    out = np.empty(count, dtype=np.int64)
+    o, w = memoryview(out), memoryview(windows)
+    sym, size = memoryview(table_symbol), memoryview(table_length)
+    p = 0
+    for k in range(count):
+        v = w[p]
+        o[k] = sym[v]
+        p += size[v]
+    return out
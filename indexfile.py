@@ -0,0 +1,304 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+import stranded
+from collection import SegmentedCollection
+from fmindex import FMIndex
+
+MAGIC = b"FMINDEX\0"
+VERSION = 2
+
+# magic, version and length of the JSON header
+_PREAMBLE = struct.Struct("<8sII")
+# arrays start on cache-line boundaries
+_ALIGN = 64
+
+# prefix of the array names of the index of the reversed reference
+_REVERSE = "reverse."
+
+
+def _aligned(offset):
+    """
+    Round an offset up to the next array boundary
+    """
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _scalars(index):
+    """
+    Alphabet and sampling rates of an index, as stored in the header
+    """
+    return {
+        "alphabet": "".join(index.alphabet),
+        "occ_rate": index.occ_rate,
+        "sa_rate": index.sa_rate,
+    }
+
+
+def _write(path, header, arrays):
+    """
+    Write a preamble, a JSON header and raw arrays to a file, through a
+    temporary copy replacing the file once written
+    """
+    header["arrays"] = {}
+    # offsets depend on the header length, which depends on the offsets
+    start = 0
+    while True:
+        blob = json.dumps(header).encode()
+        needed = _aligned(_PREAMBLE.size + len(blob))
+        if needed == start:
+            break
+        start = offset = needed
+        for key, array in arrays.items():
+            header["arrays"][key] = {
+                "offset": offset,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+            }
+            offset = _aligned(offset + array.nbytes)
+
+    with open(path + ".tmp", "wb") as handle:
+        handle.write(_PREAMBLE.pack(MAGIC, VERSION, len(blob)))
+        handle.write(blob)
+        for key, array in arrays.items():
+            handle.seek(header["arrays"][key]["offset"])
+            handle.write(array.tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def _save_segments(index, path, name, files, serial):
+    """
+    Write the segments of a SegmentedCollection that have no file yet,
+    then the file listing them
+
+    Parameters
+    ----------
+    index : SegmentedCollection
+        index to write
+    path : str
+        index file, listing the segment files
+    name : str
+        name of the indexed reference
+    files : dict
+        file of each segment already written, by segment identity
+    serial : int
+        number of the next segment file
+
+    Returns
+    -------
+    list
+        segment files, relative to the directory of the index file
+    """
+    directory, base = os.path.split(path)
+    segments = []
+    for segment in index.segments:
+        if id(segment) not in files:
+            files[id(segment)] = f"{base}.{serial}"
+            serial += 1
+            save(segment, os.path.join(directory, files[id(segment)]), name)
+        segments.append(files[id(segment)])
+    header = {"name": name, **_scalars(index), "segments": segments}
+    header["next_segment"] = serial
+    _write(path, header, {})
+    return segments
+
+
+def save(index, path, name="", reverse=None):
+    """
+    Write an FM-index to a binary file
+
+    The file holds a preamble (magic, version, header length), a JSON header
+    describing the index and the offset, dtype and shape of each array, then
+    the raw arrays. The index of the reversed reference, pruning approximate
+    search, is stored alongside when given.
+
+    The segments of a SegmentedCollection are written to files of their
+    own, named after the index file with the number of the segment, the
+    index file only listing them.
+
+    Parameters
+    ----------
+    index : FMIndex or SegmentedCollection
+        index to write
+    path : str
+        output file
+    name : str
+        name of the indexed reference, from its FASTA header
+    reverse : FMIndex, optional
+        index of the reversed reference
+    """
+    if isinstance(index, SegmentedCollection):
+        _save_segments(index, path, name, {}, 0)
+        return
+    arrays = {k: np.ascontiguousarray(v) for k, v in index.arrays().items()}
+    header = {
+        "name": name,
+        **_scalars(index),
+        "forward_length": getattr(index, "forward_length", None),
+    }
+    if reverse is not None:
+        header["reverse"] = _scalars(reverse)
+        for k, v in reverse.arrays().items():
+            arrays[_REVERSE + k] = np.ascontiguousarray(v)
+    _write(path, header, arrays)
+
+
+def read_header(path):
+    """
+    Read the header of an index file
+
+    Parameters
+    ----------
+    path : str
+        index file
+
+    Returns
+    -------
+    dict
+        header of the index
+    """
+    with open(path, "rb") as handle:
+        magic, version, size = _PREAMBLE.unpack(handle.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"not an index file: {path}")
+        if version != VERSION:
+            raise ValueError(f"unsupported index version {version}: {path}")
+        return json.loads(handle.read(size))
+
+
+def is_index(path):
+    """
+    Check whether a file is an index file
+
+    Parameters
+    ----------
+    path : str
+        file to check
+
+    Returns
+    -------
+    bool
+        True if the file starts with the index magic
+    """
+    with open(path, "rb") as handle:
+        return handle.read(len(MAGIC)) == MAGIC
+
+
+def _map_arrays(path, header, reverse=False):
+    """
+    Memory-map the arrays of the index of an index file, or those of the
+    index of the reversed reference
+    """
+    arrays = {}
+    for key, spec in header["arrays"].items():
+        if key.startswith(_REVERSE) != reverse:
+            continue
+        shape = tuple(spec["shape"])
+        name = key[len(_REVERSE) :] if reverse else key
+        if np.prod(shape) == 0:
+            arrays[name] = np.empty(shape, dtype=spec["dtype"])
+            continue
+        arrays[name] = np.memmap(
+            path, dtype=spec["dtype"], mode="r", offset=spec["offset"], shape=shape
+        )
+    return arrays
+
+
+def load(path):
+    """
+    Load an index file, memory-mapping its arrays
+
+    Pages are only read from disk when the search touches them.
+
+    Parameters
+    ----------
+    path : str
+        index file
+
+    Returns
+    -------
+    str
+        name of the indexed reference
+    FMIndex, stranded.StrandedIndex or SegmentedCollection
+        index over the memory-mapped arrays
+    """
+    header = read_header(path)
+    if "segments" in header:
+        directory = os.path.dirname(path)
+        segments = [load(os.path.join(directory, f))[1] for f in header["segments"]]
+        return header["name"], SegmentedCollection(segments)
+    index = stranded.from_arrays(
+        header["alphabet"],
+        header["occ_rate"],
+        header["sa_rate"],
+        _map_arrays(path, header),
+        header.get("forward_length"),
+    )
+    return header["name"], index
+
+
+def load_reverse(path):
+    """
+    Load the index of the reversed reference stored in an index file
+
+    Parameters
+    ----------
+    path : str
+        index file
+
+    Returns
+    -------
+    FMIndex or None
+        index over the memory-mapped arrays, None if the file has none
+    """
+    header = read_header(path)
+    if "reverse" not in header:
+        return None
+    scalars = header["reverse"]
+    return FMIndex.from_arrays(
+        scalars["alphabet"],
+        scalars["occ_rate"],
+        scalars["sa_rate"],
+        _map_arrays(path, header, reverse=True),
+    )
+
+
+def append(path, seqs):
+    """
+    Add sequences to the collection index of an index file
+
+    The new sequences are indexed as a new segment, merged with the last
+    segments as SegmentedCollection.append does. Only the merged segments
+    are written, to new files, the others keeping theirs, so the amortised
+    cost is proportional to the added data rather than to the size of the
+    collection. A file holding a single CollectionIndex becomes the first
+    segment. Any index of the reversed reference is dropped, as it no
+    longer matches the collection.
+
+    Parameters
+    ----------
+    path : str
+        index file of a collection.CollectionIndex or SegmentedCollection
+    seqs : list
+        DNA sequences to add
+    """
+    header = read_header(path)
+    name, index = load(path)
+    if not hasattr(index, "append"):
+        raise ValueError(f"not a collection index: {path}")
+    directory, base = os.path.split(path)
+    if "segments" in header:
+        old, serial = header["segments"], header["next_segment"]
+    else:
+        # the loaded arrays map the file, which keeps them under a new name
+        old, serial = [f"{base}.0"], 1
+        os.replace(path, os.path.join(directory, old[0]))
+        index = SegmentedCollection([index])
+    files = {id(segment): f for segment, f in zip(index.segments, old)}
+    extended = index.append(seqs)
+    kept = _save_segments(extended, path, name, files, serial)
+    for f in set(old) - set(kept):
+        os.remove(os.path.join(directory, f))
@@ -1,5 +1,224 @@
 import numpy as np
 
+import encoding
+
+
+def classify(t):
+    """
+    Calculate the suffix types of an integer text, in a single vectorized pass
+
+    Parameters
+    ----------
+    t : np.array
+        integer text, ending with a unique smallest sentinel
+
+    Returns
+    -------
+    np.array
+        boolean array, True for S-type suffixes and False for L-type suffixes
+    np.array
+        positions of the LMS suffixes, in text order
+    """
+    n = len(t)
+    # -1 where the type is decided by the next suffix (equal characters)
+    diff = np.sign(t[1:].astype(np.int64) - t[:-1].astype(np.int64))
+    known = np.append(diff, 1)
+    idx = np.where(known != 0, np.arange(n), n - 1)
+    # propagate each decided type leftwards over runs of equal characters
+    idx = np.minimum.accumulate(idx[::-1])[::-1]
+    stypes = known[idx] > 0
+    lms = np.flatnonzero(stypes[1:] & ~stypes[:-1]) + 1
+    return stypes, lms.astype(encoding.index_dtype(n))
+
+
+def buckets(t, sigma):
+    """
+    Calculate the bucket heads and ends of an integer text
+
+    Parameters
+    ----------
+    t : np.array
+        integer text
+    sigma : int
+        alphabet size, all codes must be lower than sigma
+
+    Returns
+    -------
+    np.array
+        index of the first slot of each bucket
+    np.array
+        index following the last slot of each bucket
+    """
+    counts = np.bincount(t, minlength=sigma)
+    ends = np.cumsum(counts)
+    return ends - counts, ends
+
+
+def place_lms(t, sa, lms, ends):
+    """
+    Place LMS suffixes at the end of their buckets, keeping their order
+
+    Parameters
+    ----------
+    t : np.array
+        integer text
+    sa : np.array
+        suffix array being built, filled with -1
+    lms : np.array
+        LMS positions, sorted or not, in the order to keep in each bucket
+    ends : np.array
+        index following the last slot of each bucket
+    """
+    codes = t[lms]
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    # rank of each suffix counted from the end of its bucket
+    counts = np.bincount(codes, minlength=len(ends))
+    first = np.cumsum(counts) - counts
+    rank = np.arange(len(codes)) - first[codes]
+    sa[ends[codes] - counts[codes] + rank] = lms[order]
+
+
+def induce(t, stypes, lms, sigma):
+    """
+    Induce sort all the suffixes from the ordered LMS suffixes
+
+    Parameters
+    ----------
+    t : np.array
+        integer text
+    stypes : np.array
+        suffix types
+    lms : np.array
+        LMS positions, in the order they should appear in their buckets
+    sigma : int
+        alphabet size
+
+    Returns
+    -------
+    np.array
+        induced suffix array
+    """
+    n = len(t)
+    sa = np.full(n, -1, dtype=encoding.index_dtype(n))
+    heads, ends = buckets(t, sigma)
+    place_lms(t, sa, lms, ends)
+
+    # memoryviews keep the arrays compact while giving fast scalar access
+    s, text, types = memoryview(sa), memoryview(t), memoryview(stypes)
+
+    # induce sort L-type suffixes, scanning left to right
+    bkt = heads.tolist()
+    for i in range(n):
+        j = s[i] - 1
+        if j >= 0 and not types[j]:
+            c = text[j]
+            s[bkt[c]] = j
+            bkt[c] += 1
+
+    # induce sort S-type suffixes, scanning right to left
+    bkt = ends.tolist()
+    for i in range(n - 1, -1, -1):
+        j = s[i] - 1
+        if j >= 0 and types[j]:
+            c = text[j]
+            bkt[c] -= 1
+            s[bkt[c]] = j
+    return sa
+
+
+def name_lms(t, sa, stypes, lms):
+    """
+    Name the LMS substrings, equal substrings getting the same name
+
+    Parameters
+    ----------
+    t : np.array
+        integer text
+    sa : np.array
+        suffix array with LMS substrings sorted
+    stypes : np.array
+        suffix types
+    lms : np.array
+        LMS positions, in text order
+
+    Returns
+    -------
+    np.array
+        reduced string, names of the LMS substrings in text order
+    int
+        number of distinct names
+    """
+    n = len(t)
+    is_lms = np.zeros(n, dtype=bool)
+    is_lms[lms] = True
+    ordered = sa[is_lms[sa]]
+
+    # length of each LMS substring, both bounding LMS characters included
+    length = np.ones(n, dtype=encoding.index_dtype(n))
+    length[lms[:-1]] = np.diff(lms) + 1
+
+    text, lengths = t.tolist(), length.tolist()
+    names = np.empty(len(ordered), dtype=encoding.index_dtype(n))
+    name = 0
+    prev, prev_len = ordered[0], lengths[ordered[0]]
+    names[0] = 0
+    for r, p in enumerate(ordered[1:].tolist(), start=1):
+        p_len = lengths[p]
+        if p_len != prev_len or text[p:p + p_len] != text[prev:prev + p_len]:
+            name += 1
+        names[r] = name
+        prev, prev_len = p, p_len
+
+    name_at = np.empty(n, dtype=encoding.index_dtype(n))
+    name_at[ordered] = names
+    return name_at[lms], name + 1
+
+
+def sais(t, sigma=None):
+    """
+    Suffix array construction by induced sorting (SA-IS)
+
+    The reduced problems are handled iteratively with an explicit stack of
+    levels, so memory stays bounded by the geometric sum of the reduced texts.
+
+    Parameters
+    ----------
+    t : np.array
+        integer text (np.uint8, np.int32 or np.int64), ending with a unique
+        smallest sentinel
+    sigma : int, optional
+        alphabet size, defaults to max(t) + 1
+
+    Returns
+    -------
+    np.array
+        suffix array of the text
+    """
+    t = np.asarray(t)
+    if len(t) == 1:
+        return np.zeros(1, dtype=encoding.index_dtype(1))
+    if sigma is None:
+        sigma = int(t.max()) + 1
+
+    levels = []
+    while True:
+        stypes, lms = classify(t)
+        sa = induce(t, stypes, lms, sigma)
+        reduced, n_names = name_lms(t, sa, stypes, lms)
+        levels.append((t, sigma, stypes, lms))
+        if n_names == len(lms):
+            # names are unique, the reduced suffix array is their inverse
+            sa = np.empty(len(reduced), dtype=reduced.dtype)
+            sa[reduced] = np.arange(len(reduced), dtype=reduced.dtype)
+            break
+        t, sigma = reduced, n_names
+
+    while levels:
+        t, sigma, stypes, lms = levels.pop()
+        sa = induce(t, stypes, lms[sa], sigma)
+    return sa
+
 
 class isbwt:
     """
@@ -7,19 +226,23 @@ class isbwt:
 
     Parameters
     ----------
-    s : str
-        string to transform
+    s : str or encoding.PackedSeq
+        string to transform, a "$" sentinel is appended if missing
 
     Attributes
     ----------
-    s : str
-        string to transform
+    s : np.array
+        integer codes of the string to transform, 0 being the sentinel
+    alphabet : str
+        character of each code
     stypes : np.array
-        suffix types
-    LMS : list
+        suffix types, True for S-type
+    LMS : np.array
         LMS suffixes
+    SA : np.array
+        suffix array
     transformed : np.array
-        transformed string
+        integer codes of the transformed string, one byte per code
 
     Methods
     -------
@@ -31,12 +254,15 @@ class isbwt:
         induce sort the LMS suffixes
     transform()
         transform the string
+    packed()
+        2-bit packed transformed string
     """
 
     def __init__(self, s):
-        self.s = np.array(list(s))
+        self.s, self.alphabet = encoding.terminated(s)
         self.stypes = []
         self.LMS = []
+        self.SA = []
         self.transformed = []
 
     def suffix_types(self):
@@ -46,84 +272,41 @@ class isbwt:
         Returns
         -------
         np.array
-            suffix types
+            suffix types, True for S-type
+        np.array
+            LMS suffixes
         """
-        self.stypes = np.empty(len(self.s), dtype="|S1")
-        self.stypes[-1] = "S"
-        i = len(self.s) - 2
-        while i >= 0:
-            if self.s[i] < self.s[i + 1] or (
-                self.s[i] == self.s[i + 1] and self.stypes[i + 1] == b"S"
-            ):
-                self.stypes[i] = "S"
-            else:
-                self.stypes[i] = "L"
-                if self.stypes[i + 1] == b"S":
-                    self.LMS.append(i + 1)
-            i -= 1
-        self.LMS.reverse()
+        self.stypes, self.LMS = classify(self.s)
         return self.stypes, self.LMS
 
     def get_suffixes(self):
         """
-        Compute the suffixes
+        Compute the LMS substrings
 
         Returns
         -------
         list
-            suffixes
+            LMS substrings
         """
+        if len(self.LMS) == 0:
+            self.suffix_types()
         LMS_suffixes = []
         for i in range(len(self.LMS) - 1):
-            LMS_suffixes.append(self.s[self.LMS[i] : (self.LMS[i + 1] + 1)])
+            LMS_suffix = self.s[self.LMS[i] : (self.LMS[i + 1] + 1)]
+            LMS_suffixes.append(encoding.decode(LMS_suffix, self.alphabet))
         return LMS_suffixes
 
     def induce_LMS(self):
         """
-        Induce sort the LMS suffixes
+        Induce sort the suffixes, recursing on the reduced LMS string
 
         Returns
         -------
         np.array
             Indices of the sorted suffix array
         """
-        alphabet, counter = np.unique(self.s, return_counts=True)
-
-        SA = np.ones(len(self.s), dtype=int) * -1
-        # place heads on the ends of buckets
-        heads = np.cumsum(counter) - 1
-
-        # place LMS suffixes in their buckets
-        for LMS in self.LMS:
-            # get head of letter's bucket
-            i = alphabet == self.s[LMS]
-            SA[heads[i][0]] = LMS
-            # move head backwards
-            heads[i] -= 1
-
-        # place heads on the beginning of buckets
-        heads = np.cumsum(counter) - counter
-
-        # induce sort L-type LMS-prefixes
-        for preffixe in SA:
-            if preffixe > 0 and self.stypes[preffixe - 1] == b"L":
-                i = alphabet == self.s[preffixe - 1]
-                SA[heads[i][0]] = preffixe - 1
-                # move head forwards
-                heads[i] += 1
-
-        # place heads on the ends of buckets
-        heads = np.cumsum(counter) - 1
-
-        # induce sort non-size-one LMS-prefixes
-        for preffixe in reversed(SA):
-            if preffixe > 0 and self.stypes[preffixe - 1] == b"S":
-                i = alphabet == self.s[preffixe - 1]
-                SA[heads[i][0]] = preffixe - 1
-                # move head backwards
-                heads[i] -= 1
-
-        return SA
+        self.SA = sais(self.s, len(self.alphabet))
+        return self.SA
 
     def transform(self):
         """
@@ -135,11 +318,17 @@ class isbwt:
             transformed string
         """
         SA = self.induce_LMS()
-        last_index = list(map(lambda i: (i + len(self.s) - 1) % len(self.s), SA))
-        self.transformed = np.array(list(self.s))[last_index]
+        self.transformed = self.s[SA - 1]
         return self.transformed
 
+    def packed(self):
+        """
+        Pack the transformed string on 2 bits per base
+        """
+        return encoding.pack_transform(self)
+
 
 if __name__ == "__main__":
     s = "mmiissiissiippii$"
     b = isbwt(s)
+    print(encoding.decode(b.transform(), b.alphabet))
@@ -0,0 +1,97 @@
+import numpy as np
+
+import encoding
+
+
+def encode(transformed):
+    """
+    Encode a transformed string with small integer codes
+
+    Parameters
+    ----------
+    transformed : str or np.array
+        transformed string
+
+    Returns
+    -------
+    np.array or list
+        sorted alphabet, as characters for a string
+    np.array
+        codes of the transformed string, as np.uint8
+    """
+    if isinstance(transformed, str):
+        try:
+            # bytes keep "\0", which numpy unicode arrays would strip
+            raw = np.frombuffer(transformed.encode("latin-1"), dtype=np.uint8)
+        except UnicodeEncodeError:
+            transformed = list(transformed)
+        else:
+            alphabet, codes = np.unique(raw, return_inverse=True)
+            return list(alphabet.tobytes().decode("latin-1")), codes.astype(np.uint8)
+    alphabet, codes = np.unique(np.asarray(transformed), return_inverse=True)
+    return alphabet, codes.astype(np.uint8)
+
+
+def lf_mapping(codes):
+    """
+    Compute the last-to-first mapping of a whole transform in one pass
+
+    Parameters
+    ----------
+    codes : np.array
+        integer codes of the transformed string
+
+    Returns
+    -------
+    np.array
+        row of the sorted matrix reached from each row by the LF mapping
+    """
+    order = np.argsort(codes, kind="stable")
+    lf = np.empty(len(codes), dtype=encoding.index_dtype(len(codes)))
+    lf[order] = np.arange(len(codes), dtype=lf.dtype)
+    return lf
+
+
+def inverse_codes(codes):
+    """
+    Invert a transform given as integer codes, the sentinel being code 0
+
+    Parameters
+    ----------
+    codes : np.array
+        integer codes of the transformed string
+
+    Returns
+    -------
+    np.array
+        codes of the original string without the sentinel, as np.uint8
+    """
+    codes = np.ascontiguousarray(codes)
+    lf = lf_mapping(codes)
+    out = np.empty(len(codes) - 1, dtype=np.uint8)
+    L, LF, o = memoryview(codes), memoryview(lf), memoryview(out)
+    # row 0 is the sentinel suffix, its last column holds the final character
+    p = 0
+    for k in range(len(out) - 1, -1, -1):
+        o[k] = L[p]
+        p = LF[p]
+    return out
+
+
+def inverse(transformed):
+    """
+    Invert a Burrows-Wheeler transform ending with a "$" sentinel
+
+    Parameters
+    ----------
+    transformed : str or np.array
+        transformed string
+
+    Returns
+    -------
+    str
+        original string, without the sentinel
+    """
+    alphabet, codes = encode(transformed)
+    table = np.frombuffer("".join(alphabet).encode("latin-1"), dtype=np.uint8)
+    return table[inverse_codes(codes)].tobytes().decode("latin-1")
@@ -0,0 +1,149 @@
+import numpy as np
+
+import approx
+import seed
+import stranded
+from collection import SegmentedCollection
+
+
+def search_batch(index, seqs):
+    """
+    Exact backward search of reads, reads of the same length being searched
+    in lockstep
+
+    Parameters
+    ----------
+    index : FMIndex
+        index of the reference
+    seqs : list
+        read sequences
+
+    Returns
+    -------
+    np.array
+        first suffix array row of each read
+    np.array
+        row following the last one of each read
+    """
+    lengths = np.array([len(s) for s in seqs], dtype=np.int64)
+    sp = np.zeros(len(seqs), dtype=np.int64)
+    ep = np.zeros(len(seqs), dtype=np.int64)
+    for length in np.unique(lengths):
+        group = np.flatnonzero(lengths == length)
+        codes = index.encode_batch([seqs[i] for i in group])
+        sp[group], ep[group] = index.backward_search_batch(codes)
+    return sp, ep
+
+
+def locate_batch(index, seqs):
+    """
+    Exact positions of reads, searched in lockstep, in every segment of a
+    SegmentedCollection
+
+    Parameters
+    ----------
+    index : FMIndex or SegmentedCollection
+        index of the reference
+    seqs : list
+        read sequences
+
+    Returns
+    -------
+    list
+        sorted positions of each read
+    """
+    if isinstance(index, SegmentedCollection):
+        found = [locate_batch(segment, seqs) for segment in index.segments]
+        starts = index.starts.tolist()
+        return [
+            np.concatenate([f[i] + start for f, start in zip(found, starts)])
+            for i in range(len(seqs))
+        ]
+    return [index.locate_interval(sp, ep) for sp, ep in zip(*search_batch(index, seqs))]
+
+
+def map_batch(
+    index, batch, reverse=None, mismatches=0, edits=False, ref=None, k=0, band=5
+):
+    """
+    Map a batch of reads by exact or approximate backward search, or by
+    seed-and-extend when a seed length is given
+
+    Parameters
+    ----------
+    index : FMIndex, stranded.StrandedIndex or SegmentedCollection
+        index of the reference, hits being searched on both strands at once
+        with a StrandedIndex, a SegmentedCollection only being searched
+        exactly
+    batch : list
+        reads, as name and sequence tuples
+    reverse : FMIndex, optional
+        index of the reversed text, pruning approximate search
+    mismatches : int
+        maximum number of differences per read
+    edits : bool
+        allow insertions and deletions on top of mismatches
+    ref : np.array, optional
+        codes of the indexed text, needed to extend seeds
+    k : int
+        seed length, 0 to search whole reads
+    band : int
+        band half-width of the seed extension
+
+    Returns
+    -------
+    list
+        start position, name, strand and number of differences of every
+        hit, or start position, name, strand, score and CIGAR string of the
+        best alignment of every read with seed-and-extend
+    """
+    hits = []
+    seqs = [seq.upper() for _, seq in batch]
+    if not k and not mismatches:
+        located = iter(locate_batch(index, seqs))
+    for (name, _), seq in zip(batch, seqs):
+        if k:
+            hit = seed.seed_and_extend(index, ref, seq, k, band=band)
+            if hit is not None:
+                hits.append((hit[0], name) + hit[1:])
+            continue
+        if mismatches:
+            positions, diffs, spans = approx.locate(
+                index, seq, mismatches, reverse, edits
+            )
+        else:
+            positions = next(located)
+            diffs = np.zeros(len(positions), dtype=np.int64)
+            spans = len(seq)
+        strands = np.full(len(positions), "+")
+        if isinstance(index, stranded.StrandedIndex):
+            # indels make the reference span differ from the read length
+            positions, strands, keep = index.orient(positions, spans)
+            diffs = diffs[keep]
+        for position, strand, diff in zip(positions, strands, diffs):
+            hits.append((int(position), name, str(strand), int(diff)))
+    return hits
+
+
+def map_reads(index, batches, reverse=None, **options):
+    """
+    Map batches of reads lazily, keeping a single batch in memory
+
+    Parameters
+    ----------
+    index : FMIndex
+        index of the reference
+    batches : iterable
+        batches of reads
+    reverse : FMIndex, optional
+        index of the reversed reference
+    **options
+        mapping options of map_batch
+
+    Yields
+    ------
+    list
+        hits of each batch
+    """
+    for batch in batches:
+        yield map_batch(index, batch, reverse, **options)
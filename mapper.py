@@ -0,0 +1,215 @@
+import argparse
+import sys
+
+import approx
+import encoding
+import indexfile
+import isbwt
+import mapbatch
+import parallel
+import seqio
+import stranded
+from fmindex import PRESETS, FMIndex
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "reference",
+    help="reference FASTA file, or index file written with --save-index",
+)
+parser.add_argument(
+    "reads",
+    help="FASTA/FASTQ reads, plain, gzip compressed or in a tar archive",
+)
+parser.add_argument(
+    "-m",
+    "--member",
+    help="tar member holding the reads, all members are mapped if omitted",
+)
+parser.add_argument(
+    "-b",
+    "--batch-size",
+    type=int,
+    default=1000,
+    help="number of reads mapped per batch",
+)
+parser.add_argument(
+    "-p",
+    "--preset",
+    default="balanced",
+    choices=list(PRESETS),
+    help="index sampling preset",
+)
+parser.add_argument(
+    "-r",
+    "--both-strands",
+    action="store_true",
+    help="index the reverse complement too, mapping reads on both strands",
+)
+parser.add_argument(
+    "-k",
+    "--mismatches",
+    type=int,
+    default=0,
+    help="maximum number of differences per read",
+)
+parser.add_argument(
+    "-e",
+    "--edits",
+    action="store_true",
+    help="count insertions and deletions as differences, not only mismatches",
+)
+parser.add_argument(
+    "--seed",
+    type=int,
+    default=0,
+    help="seed-and-extend with seeds of this length instead of whole-read search",
+)
+parser.add_argument(
+    "--band",
+    type=int,
+    default=5,
+    help="band half-width of the seed extension",
+)
+parser.add_argument(
+    "-t",
+    "--threads",
+    type=int,
+    default=1,
+    help="number of mapping processes, sharing the index",
+)
+parser.add_argument(
+    "-s",
+    "--save-index",
+    help="write the index of the reference to this file, with the index of "
+    "the reversed reference when -k is given",
+)
+parser.add_argument(
+    "-o",
+    "--output",
+    help="output TSV file, standard output if omitted",
+)
+
+
+def read_text(path, both_strands=False):
+    """
+    Read the text to index from a reference FASTA file
+
+    Parameters
+    ----------
+    path : str
+        reference FASTA file
+    both_strands : bool
+        append the reverse complement of the reference
+
+    Returns
+    -------
+    str
+        name of the reference
+    str
+        text to index
+    """
+    name, seq = seqio.read_reference(path)
+    seq = seq.upper()
+    return name, stranded.doubled(seq) if both_strands else seq
+
+
+def build_index(seq, preset="balanced", both_strands=False):
+    """
+    Build the FM-index of a reference
+
+    Parameters
+    ----------
+    seq : str
+        reference sequence, as returned by read_text
+    preset : str
+        sampling rates and rank structure, one of PRESETS
+    both_strands : bool
+        build a StrandedIndex over the reference and its reverse complement
+
+    Returns
+    -------
+    FMIndex or stranded.StrandedIndex
+        index of the reference
+    """
+    if both_strands:
+        return stranded.StrandedIndex.from_sequence(seq, preset)
+    return FMIndex.from_transform(isbwt.isbwt(seq), preset)
+
+
+def build_reverse(seq, preset="balanced", both_strands=False):
+    """
+    Build the FM-index of the reversed reference, bounding approximate search
+
+    Parameters
+    ----------
+    seq : str
+        reference sequence, as returned by read_text
+    preset : str
+        sampling rates and rank structure, one of PRESETS
+    both_strands : bool
+        reverse the reference followed by its reverse complement
+
+    Returns
+    -------
+    FMIndex
+        index of the reversed reference
+    """
+    return approx.reverse_index(stranded.doubled(seq) if both_strands else seq, preset)
+
+
+def write_hits(hits, handle):
+    """
+    Write hits as the TSV read by plot_align.R
+
+    Parameters
+    ----------
+    hits : list
+        hits, starting with their position
+    handle : io.TextIOBase
+        output stream
+    """
+    for hit in hits:
+        handle.write("\t".join(map(str, hit)) + "\n")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    args = parser.parse_args(args)
+
+    options = {"mismatches": args.mismatches, "edits": args.edits}
+    reverse = None
+    if indexfile.is_index(args.reference):
+        if args.seed:
+            parser.error("--seed needs the reference FASTA file")
+        name, index = indexfile.load(args.reference)
+        if args.mismatches:
+            reverse = indexfile.load_reverse(args.reference)
+            if reverse is None:
+                parser.error(
+                    "-k needs the reference FASTA file, or an index file "
+                    "saved with -s and -k"
+                )
+    else:
+        name, seq = read_text(args.reference)
+        index = build_index(seq, args.preset, args.both_strands)
+        if args.mismatches:
+            reverse = build_reverse(seq, args.preset, args.both_strands)
+        if args.seed:
+            text = stranded.doubled(seq) if args.both_strands else seq
+            options.update(ref=encoding.encode(text), k=args.seed, band=args.band)
+    if args.save_index:
+        indexfile.save(index, args.save_index, name, reverse)
+    reads = seqio.read_sequences(args.reads, args.member)
+    batches = seqio.batches(reads, args.batch_size)
+    if args.threads > 1:
+        results = parallel.map_parallel(
+            index, batches, args.threads, reverse, **options
+        )
+    else:
+        results = mapbatch.map_reads(index, batches, reverse, **options)
+    out = open(args.output, "w") if args.output else sys.stdout
+    for hits in results:
+        write_hits(hits, out)
+    if args.output:
+        out.close()
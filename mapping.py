@@ -5,10 +5,21 @@ from random import choice
 import matplotlib.pyplot as plt
 import numpy as np
 
+import encoding
+import isbwt
+import lfmap
+from bwts import bwts as bwts_class
+from bwts import inverse as bwts_inverse
+from bwts import lyndon_starts
+
 # Burrow-Wheeler Transform
 
 
-def generate_bwt(original_seq):
+def generate_bwt(original_seq, naive=False):
+    if not naive:
+        codes, alphabet = encoding.terminated(original_seq)
+        sa = isbwt.sais(codes, len(alphabet))
+        return encoding.decode(codes[sa - 1], alphabet)
     seq = original_seq + '$'
     matrix = []
     seq_final = list()
@@ -51,15 +62,7 @@ def generate_position(s):
 
 
 def gene_seq(bwt):
-    (count, alpha) = count_alpha(bwt)
-    p = 0
-    seq = "$"
-    x = 0
-    while x != "$":
-        x = bwt[p]
-        seq = x + seq
-        p = alpha[x] + count[p]
-    return seq[1:]
+    return lfmap.inverse(bwt)
 
 
 # David A. Scott's bijective Burrows-Wheeler transform
@@ -68,21 +71,9 @@ def gene_seq(bwt):
 # wikiwand.com/en/Lyndon_word#Duval_algorithm
 
 def lf_duval(s):
-    i = 0
-    factors = []
-    while (i < len(s)):
-        j = i + 1
-        k = i
-        while j < len(s) and s[k] <= s[j]:
-            if s[k] < s[j]:
-                k = i
-            else:
-                k += 1
-            j += 1
-        while i <= k:
-            factors.append(s[i:(i + j - k)])
-            i += j - k
-    return factors
+    starts = lyndon_starts(np.frombuffer(s.encode("latin-1"), dtype=np.uint8))
+    bounds = np.append(starts, len(s)).tolist()
+    return [s[i:j] for i, j in zip(bounds, bounds[1:])]
 
 
 def lf_conjugates(s):
@@ -112,14 +103,12 @@ def find_cycles(p):
 
 
 def bwts(s):
-    rotations = lf_conjugates(s)
-    return ''.join(map(lambda x: x[-1], sorted(rotations)))
+    # conjugates are ordered as infinite periodic words, as ibwts expects
+    return bwts_class(s).transform()
 
 
 def ibwts(s):
-    sorted_keys = [x[0] for x in sorted(enumerate(s), key=lambda p: p[1])]
-    cycles = find_cycles(sorted_keys)
-    return ''.join(map(lambda i: s[i], sum(cycles, [])))
+    return bwts_inverse(s)
 
 
 def generate_seq(length):
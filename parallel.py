@@ -0,0 +1,230 @@
+import multiprocessing as mp
+import os
+from collections import deque
+from contextlib import ExitStack
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import mapbatch
+import stranded
+
+# indexes and options attached by each worker process
+_index = None
+_reverse = None
+_options = {}
+_blocks = []
+
+
+def share(array):
+    """
+    Copy an array to a new shared memory block
+
+    Parameters
+    ----------
+    array : np.array
+        array to share
+
+    Returns
+    -------
+    shared_memory.SharedMemory
+        block holding the copy, to close and unlink once done
+    tuple
+        picklable block name, shape and dtype, passed to attach_array()
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_array(spec):
+    """
+    Attach to an array shared by share(), without copying it
+
+    Parameters
+    ----------
+    spec : tuple
+        block name, shape and dtype of the array
+
+    Returns
+    -------
+    np.array
+        array over the shared block
+    shared_memory.SharedMemory
+        block, to keep alive as long as the array is used
+    """
+    block_name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=block_name)
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf), block
+
+
+class SharedIndex:
+    """
+    Copy of an FM-index in shared memory, attachable by other processes
+
+    Parameters
+    ----------
+    index : FMIndex
+        index to share
+
+    Attributes
+    ----------
+    spec : dict
+        picklable description of the shared blocks, passed to attach()
+    blocks : list
+        shared memory blocks, one per index array
+
+    Methods
+    -------
+    close()
+        release and unlink the shared memory blocks
+    """
+
+    def __init__(self, index):
+        self.blocks = []
+        self.spec = {
+            "alphabet": "".join(index.alphabet),
+            "occ_rate": index.occ_rate,
+            "sa_rate": index.sa_rate,
+            "forward_length": getattr(index, "forward_length", None),
+            "arrays": {},
+        }
+        for name, array in index.arrays().items():
+            block, self.spec["arrays"][name] = share(array)
+            self.blocks.append(block)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Release and unlink the shared memory blocks
+        """
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def attach(spec):
+    """
+    Attach to an index shared by SharedIndex, without copying it
+
+    Parameters
+    ----------
+    spec : dict
+        description of the shared blocks
+
+    Returns
+    -------
+    FMIndex or stranded.StrandedIndex
+        index over the shared arrays
+    list
+        shared memory blocks, to keep alive as long as the index is used
+    """
+    blocks, arrays = [], {}
+    for name, array_spec in spec["arrays"].items():
+        arrays[name], block = attach_array(array_spec)
+        blocks.append(block)
+    index = stranded.from_arrays(
+        spec["alphabet"],
+        spec["occ_rate"],
+        spec["sa_rate"],
+        arrays,
+        spec["forward_length"],
+    )
+    return index, blocks
+
+
+def _init_worker(spec, reverse_spec, options):
+    """
+    Attach the shared indexes in a worker process
+
+    Parameters
+    ----------
+    spec : dict
+        description of the shared blocks of the index
+    reverse_spec : dict or None
+        description of the shared blocks of the reverse index
+    options : dict
+        mapping options of mapbatch.map_batch, the reference codes being
+        given as the spec of their shared block
+    """
+    global _index, _reverse, _options, _blocks
+    _index, _blocks = attach(spec)
+    if reverse_spec is not None:
+        _reverse, reverse_blocks = attach(reverse_spec)
+        _blocks += reverse_blocks
+    _options = dict(options)
+    if options.get("ref") is not None:
+        _options["ref"], block = attach_array(options["ref"])
+        _blocks.append(block)
+
+
+def _map_batch(batch):
+    """
+    Map a batch of reads against the index attached by the worker
+
+    Parameters
+    ----------
+    batch : list
+        reads, as name and sequence tuples
+
+    Returns
+    -------
+    list
+        hits of the batch
+    """
+    return mapbatch.map_batch(_index, batch, _reverse, **_options)
+
+
+def map_parallel(index, batches, processes=None, reverse=None, **options):
+    """
+    Map batches of reads on a pool of processes sharing a single index
+
+    Batches are submitted lazily, at most two per process being in flight,
+    and their hits are yielded in input order. The reference codes used to
+    extend seeds are shared like the index arrays.
+
+    Parameters
+    ----------
+    index : FMIndex
+        index of the reference
+    batches : iterable
+        batches of reads
+    processes : int, optional
+        number of worker processes, defaults to the number of CPUs
+    reverse : FMIndex, optional
+        index of the reversed reference, shared as well
+    **options
+        mapping options of mapbatch.map_batch
+
+    Yields
+    ------
+    list
+        hits of each batch
+    """
+    processes = processes or os.cpu_count()
+    with ExitStack() as stack:
+        spec = stack.enter_context(SharedIndex(index)).spec
+        reverse_spec = None
+        if reverse is not None:
+            reverse_spec = stack.enter_context(SharedIndex(reverse)).spec
+        options = dict(options)
+        if options.get("ref") is not None:
+            block, options["ref"] = share(np.asarray(options["ref"]))
+            stack.callback(block.unlink)
+            stack.callback(block.close)
+        initargs = (spec, reverse_spec, options)
+        pool = stack.enter_context(mp.Pool(processes, _init_worker, initargs))
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(_map_batch, (batch,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
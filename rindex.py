@@ -0,0 +1,455 @@
+import numpy as np
+
+import isbwt
+
+# arrays holding the index, all of them of size proportional to the runs
+ARRAYS = (
+    "heads",
+    "starts",
+    "by_code",
+    "code_bounds",
+    "cum",
+    "sa_last",
+    "phi_keys",
+    "phi_values",
+)
+
+
+class RIndex:
+    """
+    Run-length encoded FM-index (r-index) of a repetitive text
+
+    The transformed string is stored as its r runs, and the suffix array is
+    only sampled at the first and last row of every run, so that memory
+    grows with the number of runs rather than with the text length. Backward
+    search keeps the text position of the last row of the interval (the
+    toehold), from which every occurrence is recovered with the phi
+    function, SA[i - 1] = phi(SA[i]).
+
+    Parameters
+    ----------
+    transformed : np.array
+        integer codes of the transformed string, containing a single
+        sentinel of code 0
+    sa : np.array
+        suffix array the transform was extracted from
+    alphabet : str
+        character of each code
+
+    Attributes
+    ----------
+    alphabet : np.array
+        sorted alphabet of the transformed string, sentinel included
+    code : dict
+        code of each character of the alphabet
+    n : int
+        length of the transformed string
+    heads : np.array
+        code of each run
+    starts : np.array
+        first row of each run, followed by n
+    by_code : np.array
+        runs sorted by code, then by row
+    code_bounds : np.array
+        slice of by_code holding the runs of each code
+    cum : np.array
+        number of rows, in by_code order, preceding each run of by_code,
+        runs of smaller codes included
+    sa_last : np.array
+        text position of the last row of each run
+    phi_keys : np.array
+        sorted text positions of the first row of each run but the first
+    phi_values : np.array
+        text position of the row preceding each of phi_keys
+    seq_starts : np.array or None
+        start of each sequence of a collection built by from_sequences
+
+    Methods
+    -------
+    from_transform(b)
+        build the index from a sabwt or isbwt object
+    from_sequences(seqs, separator)
+        build the index of a collection of sequences
+    arrays()
+        arrays holding the index
+    runs()
+        number of runs of the transformed string
+    run_of(i)
+        run holding a row
+    rank(c, i)
+        number of occurrences of code c in the first i transformed characters
+    select(c, k)
+        row of the k-th occurrence of code c
+    lf(c, i)
+        last-to-first mapping of code c at position i
+    encode(pattern)
+        encode a pattern with the alphabet codes
+    backward_search(pattern)
+        interval of the suffix array prefixed by the pattern, and toehold
+    count(pattern)
+        number of occurrences of the pattern
+    phi(p)
+        text position of the row preceding the suffix at text position p
+    locate(pattern)
+        positions of the pattern in the original string
+    split(positions)
+        sequence and offset of positions of a collection
+    nbytes()
+        memory footprint of the index
+    """
+
+    def __init__(self, transformed, sa, alphabet):
+        self.alphabet = np.array(list(alphabet))
+        self.code = {str(c): i for i, c in enumerate(self.alphabet)}
+        codes = np.asarray(transformed, dtype=np.uint8)
+        sa = np.asarray(sa, dtype=np.int64)
+        self.n = len(codes)
+
+        first = np.flatnonzero(np.diff(codes)) + 1
+        first = np.concatenate([[0], first]).astype(np.int64)
+        self.heads = codes[first]
+        self.starts = np.append(first, self.n)
+        lengths = np.diff(self.starts)
+
+        self.by_code = np.argsort(self.heads, kind="stable").astype(np.int64)
+        counts = np.bincount(self.heads, minlength=len(self.alphabet))
+        self.code_bounds = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.cum = np.concatenate([[0], np.cumsum(lengths[self.by_code])])
+
+        self.sa_last = sa[self.starts[1:] - 1]
+        # phi maps the first row of a run to the last row of the previous one
+        sa_first = sa[first[1:]]
+        order = np.argsort(sa_first)
+        self.phi_keys = sa_first[order]
+        self.phi_values = self.sa_last[:-1][order]
+        self.seq_starts = None
+
+    @classmethod
+    def from_transform(cls, b):
+        """
+        Build the index from a sabwt or isbwt object
+
+        Parameters
+        ----------
+        b : sabwt or isbwt
+            transform object, transformed if not already done
+
+        Returns
+        -------
+        RIndex
+            index of the transformed string
+        """
+        if len(b.transformed) == 0:
+            b.transform()
+        return cls(b.transformed, b.SA, b.alphabet)
+
+    @classmethod
+    def from_sequences(cls, seqs, separator="N"):
+        """
+        Build the index of the concatenation of a collection of sequences,
+        such as the genomes of a virus
+
+        Parameters
+        ----------
+        seqs : list
+            sequences to index
+        separator : str
+            character inserted between two sequences
+
+        Returns
+        -------
+        RIndex
+            index of the collection
+        """
+        index = cls.from_transform(isbwt.isbwt(separator.join(seqs)))
+        lengths = np.array([len(s) + len(separator) for s in seqs], dtype=np.int64)
+        index.seq_starts = np.cumsum(lengths) - lengths
+        return index
+
+    def arrays(self):
+        """
+        Arrays holding the index
+
+        Returns
+        -------
+        dict
+            index arrays, by name
+        """
+        return {name: getattr(self, name) for name in ARRAYS}
+
+    def __len__(self):
+        return self.n
+
+    def runs(self):
+        """
+        Number of runs of the transformed string
+
+        Returns
+        -------
+        int
+            number of runs
+        """
+        return len(self.heads)
+
+    def run_of(self, i):
+        """
+        Find the run holding a row
+
+        Parameters
+        ----------
+        i : int
+            row of the transformed string
+
+        Returns
+        -------
+        int
+            run holding the row
+        """
+        return int(np.searchsorted(self.starts, i, side="right")) - 1
+
+    def _code_runs(self, c, j):
+        """
+        Position in by_code of the first run of code c at or after run j
+        """
+        lo, hi = self.code_bounds[c], self.code_bounds[c + 1]
+        return int(lo + np.searchsorted(self.by_code[lo:hi], j))
+
+    def rank(self, c, i):
+        """
+        Number of occurrences of code c in the first i transformed characters
+
+        Parameters
+        ----------
+        c : int
+            character code
+        i : int
+            prefix length
+
+        Returns
+        -------
+        int
+            rank of c at position i
+        """
+        return self.lf(c, i) - int(self.cum[self.code_bounds[c]])
+
+    def select(self, c, k):
+        """
+        Find the row of the k-th occurrence of code c
+
+        Parameters
+        ----------
+        c : int
+            character code
+        k : int
+            rank of the occurrence, from 0
+
+        Returns
+        -------
+        int
+            row of the occurrence
+        """
+        lo, hi = self.code_bounds[c], self.code_bounds[c + 1]
+        offset = int(self.cum[lo]) + k
+        if not 0 <= k < int(self.cum[hi]) - int(self.cum[lo]):
+            raise IndexError(f"code {c} has no occurrence {k}")
+        m = int(np.searchsorted(self.cum[lo : hi + 1], offset, side="right")) - 1
+        run = int(self.by_code[lo + m])
+        return int(self.starts[run]) + offset - int(self.cum[lo + m])
+
+    def lf(self, c, i):
+        """
+        Last-to-first mapping of code c at position i
+
+        Parameters
+        ----------
+        c : int
+            character code
+        i : int
+            position in the transformed string
+
+        Returns
+        -------
+        int
+            row of the sorted matrix starting with that occurrence of c
+        """
+        if i >= self.n:
+            return int(self.cum[self.code_bounds[c + 1]])
+        j = self.run_of(i)
+        k = self._code_runs(c, j)
+        if self.heads[j] == c:
+            return int(self.cum[k]) + i - int(self.starts[j])
+        return int(self.cum[k])
+
+    def encode(self, pattern):
+        """
+        Encode a pattern with the alphabet codes
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to encode
+
+        Returns
+        -------
+        list or None
+            codes of the pattern, None if a character is not in the alphabet
+        """
+        try:
+            return [self.code[c] for c in pattern]
+        except KeyError:
+            return None
+
+    def backward_search(self, pattern):
+        """
+        Find the suffix array interval of the suffixes prefixed by the
+        pattern, along with the text position of its last row
+
+        When the last row of the interval does not precede an occurrence of
+        the next code, the last such row ends a run, whose suffix is sampled.
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to search
+
+        Returns
+        -------
+        tuple
+            half-open interval [sp, ep), empty if sp >= ep
+        int or None
+            text position of row ep - 1, None if the interval is empty
+        """
+        codes = self.encode(pattern)
+        if codes is None:
+            return (0, 0), None
+        sp, ep = 0, self.n
+        toehold = int(self.sa_last[-1])
+        for c in reversed(codes):
+            j = self.run_of(ep - 1)
+            if self.heads[j] != c:
+                k = self._code_runs(c, j) - 1
+                if k < self.code_bounds[c]:
+                    return (0, 0), None
+                run = int(self.by_code[k])
+                if self.starts[run + 1] <= sp:
+                    return (0, 0), None
+                toehold = int(self.sa_last[run])
+            sp, ep = self.lf(c, sp), self.lf(c, ep)
+            if sp >= ep:
+                return (0, 0), None
+            toehold = (toehold - 1) % self.n
+        return (sp, ep), toehold
+
+    def count(self, pattern):
+        """
+        Count the occurrences of the pattern
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to count
+
+        Returns
+        -------
+        int
+            number of occurrences
+        """
+        (sp, ep), _ = self.backward_search(pattern)
+        return ep - sp
+
+    def phi(self, p):
+        """
+        Text position of the suffix preceding the suffix at text position p
+        in the suffix array
+
+        Suffixes starting in the same run keep their predecessors in the
+        previous rows, so phi(p) is phi(q) + p - q for the nearest sampled q.
+
+        Parameters
+        ----------
+        p : int
+            text position, not that of the first row
+
+        Returns
+        -------
+        int
+            text position of the preceding row
+        """
+        k = int(np.searchsorted(self.phi_keys, p, side="right")) - 1
+        return int(self.phi_values[k]) + p - int(self.phi_keys[k])
+
+    def locate(self, pattern):
+        """
+        Locate the occurrences of the pattern from the toehold
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to locate
+
+        Returns
+        -------
+        np.array
+            sorted start positions of the pattern in the original string
+        """
+        (sp, ep), p = self.backward_search(pattern)
+        positions = np.empty(ep - sp, dtype=np.int64)
+        for i in range(ep - sp):
+            positions[i] = p
+            if i < ep - sp - 1:
+                p = self.phi(p)
+        return np.sort(positions)
+
+    def split(self, positions):
+        """
+        Map positions of an index built by from_sequences to the sequence
+        they fall in
+
+        Parameters
+        ----------
+        positions : np.array
+            positions in the concatenated sequences
+
+        Returns
+        -------
+        np.array
+            index of the sequence of each position
+        np.array
+            offset of each position in its sequence
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        seqs = np.searchsorted(self.seq_starts, positions, side="right") - 1
+        return seqs, positions - self.seq_starts[seqs]
+
+    def nbytes(self):
+        """
+        Memory footprint of the index arrays
+
+        Returns
+        -------
+        int
+            size in bytes
+        """
+        return sum(array.nbytes for array in self.arrays().values())
+
+
+if __name__ == "__main__":
+    from random import choice, randrange, seed
+
+    from fmindex import FMIndex
+
+    seed(0)
+    genome = "".join(choice("ACGT") for _ in range(30000))
+    genomes = []
+    for _ in range(50):
+        variant = list(genome)
+        for _ in range(10):
+            variant[randrange(len(variant))] = choice("ACGT")
+        genomes.append("".join(variant))
+
+    r = RIndex.from_sequences(genomes)
+    fm = FMIndex.from_transform(isbwt.isbwt("N".join(genomes)))
+    print(f"n = {len(r)}, r = {r.runs()}")
+    print(f"r-index: {r.nbytes()} bytes, FM-index: {fm.nbytes()} bytes")
+    pattern = genome[1000:1020]
+    print(r.count(pattern), r.split(r.locate(pattern))[0][:10])
@@ -1,5 +1,49 @@
+import tempfile
+
 import numpy as np
 
+import encoding
+import external
+import lfmap
+
+
+def prefix_doubling(t):
+    """
+    Suffix array construction by prefix doubling (Manber-Myers)
+
+    At each round, suffixes are sorted by the pair of ranks of their first h
+    characters and of the h following ones, packed into a single 64-bit key,
+    until every rank is unique.
+
+    Parameters
+    ----------
+    t : np.array
+        integer text, ending with a unique smallest sentinel
+
+    Returns
+    -------
+    np.array
+        suffix array of the text
+    """
+    n = len(t)
+    dtype = encoding.index_dtype(n)
+    rank = t.astype(np.int64)
+    sa = np.argsort(rank, kind="stable").astype(dtype)
+    h = 1
+    while True:
+        # dense ranks of the sorted keys, starting from 1
+        keys = rank[sa]
+        rank[sa] = np.concatenate([[1], 1 + np.cumsum(keys[1:] != keys[:-1])])
+        if rank[sa[-1]] == n:
+            return sa
+        # suffixes shorter than h get 0 as second rank
+        second = np.zeros(n, dtype=np.int64)
+        second[: n - h] = rank[h:]
+        keys = rank * (n + 1) + second
+        sa = np.argsort(keys).astype(dtype)
+        rank = keys
+        h *= 2
+
 
 class sabwt:
     """
@@ -7,15 +51,24 @@ class sabwt:
 
     Parameters
     ----------
-    s : str
-        string to transform
+    s : str or encoding.PackedSeq
+        string to transform, a "$" sentinel is appended if missing
+    method : str
+        suffix sorting backend, "naive" comparing suffixes, "doubling" or
+        "external" sorting blocks of suffixes in a disk-backed array
 
     Attributes
     ----------
-    s : str
-        string to transform
+    s : np.array
+        integer codes of the string to transform, ending with the sentinel
+    alphabet : str
+        character of each code
+    method : str
+        suffix sorting backend
+    SA : list
+        suffix array
     transformed : np.array
-        transformed string
+        integer codes of the transformed string, one byte per code
     count_table : list
         alphabet indices of each character in the transformed string
     alpha : dict
@@ -33,10 +86,16 @@ class sabwt:
         generate the position
     inverse()
         inverse the transform
+    packed()
+        2-bit packed transformed string
     """
 
-    def __init__(self, s):
-        self.s = s
+    def __init__(self, s, method="naive"):
+        if method not in ("naive", "doubling", "external"):
+            raise ValueError(f"unknown suffix sorting method: {method}")
+        self.s, self.alphabet = encoding.terminated(s)
+        self.method = method
+        self.SA = []
         self.transformed = []
         self.count_table = []
         self.alpha = {}
@@ -50,7 +109,14 @@ class sabwt:
         np.array
             indices of the sorted suffix array
         """
-        return sorted(range(len(self.s)), key=lambda i: self.s[i:])
+        if self.method == "doubling":
+            return prefix_doubling(self.s)
+        if self.method == "external":
+            # memory-mapped from an unlinked temporary file
+            handle = tempfile.TemporaryFile()
+            return external.suffix_array(self.s, handle, sigma=len(self.alphabet))
+        text = self.s.tobytes()
+        return sorted(range(len(text)), key=lambda i: text[i:])
 
     def transform(self):
         """
@@ -61,9 +127,8 @@ class sabwt:
         np.array
             transformed string
         """
-        sa = self.calc_suffix_array()
-        last_index = list(map(lambda i: (i + len(self.s) - 1) % len(self.s), sa))
-        self.transformed = np.array(list(self.s))[last_index]
+        sa = self.SA = np.asarray(self.calc_suffix_array())
+        self.transformed = self.s[sa - 1]
         return self.transformed
 
     def count_alpha(self):
@@ -116,14 +181,15 @@ class sabwt:
         str
             inverse of the transform
         """
-        p = 0
-        s = "$"
-        x = 0
-        while x != "$":
-            x = self.transformed[p]
-            s = x + s
-            p = self.alpha[x] + self.count_table[p]
-        return s[1:]
+        if len(self.transformed) == 0:
+            self.transform()
+        return encoding.decode(lfmap.inverse_codes(self.transformed), self.alphabet)
+
+    def packed(self):
+        """
+        Pack the transformed string on 2 bits per base
+        """
+        return encoding.pack_transform(self)
 
 
 if __name__ == "__main__":
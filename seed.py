@@ -0,0 +1,211 @@
+import numpy as np
+
+import align
+import encoding
+from stranded import StrandedIndex, reverse_cigar
+
+
+def seeds(read, k, stride):
+    """
+    Extract fixed-length seeds from a read
+
+    Parameters
+    ----------
+    read : str
+        read sequence
+    k : int
+        seed length
+    stride : int
+        distance between two seed starts, the last seed being aligned on the
+        end of the read
+
+    Returns
+    -------
+    list
+        (offset, seed) tuples
+    """
+    if len(read) < k:
+        return []
+    offsets = list(range(0, len(read) - k + 1, stride))
+    if offsets[-1] != len(read) - k:
+        offsets.append(len(read) - k)
+    return [(o, read[o : o + k]) for o in offsets]
+
+
+def diagonals(index, read, k, stride, max_occ=64):
+    """
+    Locate the seeds of a read, as diagonals of the reference
+
+    Parameters
+    ----------
+    index : FMIndex
+        index of the reference
+    read : str
+        read sequence
+    k : int
+        seed length
+    stride : int
+        distance between two seed starts
+    max_occ : int
+        seeds occurring more often are considered uninformative and skipped
+
+    Returns
+    -------
+    np.array
+        sorted diagonals, reference position minus read offset, one per seed
+        occurrence
+    """
+    found = []
+    for offset, kmer in seeds(read, k, stride):
+        if 0 < index.count(kmer) <= max_occ:
+            found.append(index.locate(kmer) - offset)
+    if not found:
+        return np.empty(0, dtype=np.int64)
+    return np.sort(np.concatenate(found))
+
+
+def cluster(diags, band, max_candidates=4):
+    """
+    Cluster close diagonals into candidate alignments
+
+    Parameters
+    ----------
+    diags : np.array
+        sorted diagonals
+    band : int
+        diagonals closer than band belong to the same cluster
+    max_candidates : int
+        number of clusters kept, the most supported first
+
+    Returns
+    -------
+    np.array
+        median diagonal of the kept clusters
+    """
+    if len(diags) == 0:
+        return diags
+    breaks = np.flatnonzero(np.diff(diags) > band) + 1
+    starts = np.concatenate([[0], breaks])
+    sizes = np.diff(np.concatenate([starts, [len(diags)]]))
+    best = np.argsort(-sizes, kind="stable")[:max_candidates]
+    return diags[starts[best] + sizes[best] // 2]
+
+
+def alignments(ref, read, diags, band, **scores):
+    """
+    Align a read around candidate diagonals by banded alignment
+
+    Parameters
+    ----------
+    ref : np.array
+        codes of the reference
+    read : str
+        read sequence
+    diags : np.array
+        candidate diagonals
+    band : int
+        band half-width
+    **scores
+        match, mismatch and gap scores of align.banded_align
+
+    Returns
+    -------
+    list
+        position, score and CIGAR string of the alignment of each
+        candidate, the best first
+    """
+    if len(diags) == 0:
+        return []
+    codes = encoding.encode(read)
+    m = len(codes)
+    # windows reaching outside of the reference are padded with N
+    pad = np.full(m + band, encoding.N_CODE, dtype=np.uint8)
+    padded = np.concatenate([pad[:band], ref, pad])
+    # the window of diagonal d covers ref[d - band : d + m + band]
+    diags = np.clip(diags, 0, len(ref))
+    windows = padded[diags[:, None] + np.arange(m + 2 * band)]
+    score, end, trace = align.banded_align(codes, windows, band, **scores)
+    hits = []
+    for i in np.argsort(-score, kind="stable").tolist():
+        start, cigar = align.traceback(trace, i, int(end[i]))
+        hits.append((int(diags[i] - band + start), int(score[i]), cigar))
+    return hits
+
+
+def extend(ref, read, diags, band, **scores):
+    """
+    Verify candidate diagonals by banded alignment
+
+    Parameters
+    ----------
+    ref : np.array
+        codes of the reference
+    read : str
+        read sequence
+    diags : np.array
+        candidate diagonals
+    band : int
+        band half-width
+    **scores
+        match, mismatch and gap scores of align.banded_align
+
+    Returns
+    -------
+    tuple or None
+        position, score and CIGAR string of the best alignment
+    """
+    hits = alignments(ref, read, diags, band, **scores)
+    return hits[0] if hits else None
+
+
+def seed_and_extend(index, ref, read, k=15, stride=5, band=5, **scores):
+    """
+    Map a read on both strands by seeding and banded alignment
+
+    With a StrandedIndex, the seeds of the read are searched once and hit
+    both strands. Otherwise, the reverse complement of the read is seeded
+    separately.
+
+    Parameters
+    ----------
+    index : FMIndex or StrandedIndex
+        index of the reference
+    ref : np.array
+        codes of the indexed text, reference and reverse complement for a
+        StrandedIndex
+    read : str
+        read sequence
+    k : int
+        seed length
+    stride : int
+        distance between two seed starts
+    band : int
+        band half-width of the alignment
+    **scores
+        match, mismatch and gap scores of align.banded_align
+
+    Returns
+    -------
+    tuple or None
+        position, strand, score and CIGAR string of the best alignment
+    """
+    if isinstance(index, StrandedIndex):
+        diags = cluster(diagonals(index, read, k, stride), band)
+        # the best alignment not spanning the separator, in score order
+        for position, score, cigar in alignments(ref, read, diags, band, **scores):
+            positions, strands, keep = index.orient(
+                [position], align.reference_span(cigar)
+            )
+            if keep[0]:
+                if strands[0] == "-":
+                    cigar = reverse_cigar(cigar)
+                return int(positions[0]), str(strands[0]), score, cigar
+        return None
+
+    best = None
+    for strand, seq in (("+", read), ("-", encoding.reverse_complement(read))):
+        diags = cluster(diagonals(index, seq, k, stride), band)
+        hit = extend(ref, seq, diags, band, **scores)
+        if hit is not None and (best is None or hit[1] > best[2]):
+            best = (hit[0], strand, hit[1], hit[2])
+    return best
@@ -0,0 +1,174 @@
+import gzip
+import io
+import tarfile
+
+
+def open_text(path):
+    """
+    Open a plain or gzip compressed text file
+
+    Parameters
+    ----------
+    path : str
+        path of the file, gzip being detected from its magic number
+
+    Returns
+    -------
+    io.TextIOBase
+        text stream
+    """
+    with open(path, "rb") as handle:
+        magic = handle.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+
+def parse(handle):
+    """
+    Parse FASTA or FASTQ records from a text stream, one at a time
+
+    Parameters
+    ----------
+    handle : io.TextIOBase
+        text stream, the format being detected from its first character
+
+    Yields
+    ------
+    tuple
+        name and sequence of each record
+    """
+    line = handle.readline()
+    while line and not line.strip():
+        line = handle.readline()
+    if line.startswith("@"):
+        yield from _parse_fastq(handle, line)
+    elif line.startswith(">"):
+        yield from _parse_fasta(handle, line)
+    elif line:
+        raise ValueError(f"not a FASTA or FASTQ stream: {line[:20]!r}")
+
+
+def _parse_fasta(handle, header):
+    """
+    Parse FASTA records, possibly wrapped on several lines
+
+    Parameters
+    ----------
+    handle : io.TextIOBase
+        text stream, positioned after the first header
+    header : str
+        first header line
+
+    Yields
+    ------
+    tuple
+        name and sequence of each record
+    """
+    name, chunks = header[1:].strip(), []
+    for line in handle:
+        if line.startswith(">"):
+            yield name, "".join(chunks)
+            name, chunks = line[1:].strip(), []
+        else:
+            chunks.append(line.strip())
+    yield name, "".join(chunks)
+
+
+def _parse_fastq(handle, header):
+    """
+    Parse four-line FASTQ records
+
+    Parameters
+    ----------
+    handle : io.TextIOBase
+        text stream, positioned after the first header
+    header : str
+        first header line
+
+    Yields
+    ------
+    tuple
+        name and sequence of each record
+    """
+    while header:
+        name = header[1:].strip()
+        seq = handle.readline().strip()
+        handle.readline()
+        handle.readline()
+        yield name, seq
+        header = handle.readline()
+        while header and not header.strip():
+            header = handle.readline()
+
+
+def read_sequences(path, member=None):
+    """
+    Stream the records of a plain, gzip or tar archived FASTA/FASTQ file
+
+    Parameters
+    ----------
+    path : str
+        path of the file
+    member : str, optional
+        name of the tar member to read, all members being read in turn
+        when omitted
+
+    Yields
+    ------
+    tuple
+        name and sequence of each record
+    """
+    if tarfile.is_tarfile(path):
+        with tarfile.open(path, "r:*") as tar:
+            for info in tar:
+                if not info.isfile() or (member and info.name != member):
+                    continue
+                with io.TextIOWrapper(tar.extractfile(info)) as handle:
+                    yield from parse(handle)
+    else:
+        with open_text(path) as handle:
+            yield from parse(handle)
+
+
+def read_reference(path):
+    """
+    Read the first record of a FASTA file, as a reference
+
+    Parameters
+    ----------
+    path : str
+        path of the file
+
+    Returns
+    -------
+    tuple
+        name and sequence of the reference
+    """
+    return next(read_sequences(path))
+
+
+def batches(records, size):
+    """
+    Group records into fixed-size batches
+
+    Parameters
+    ----------
+    records : iterable
+        records to group
+    size : int
+        number of records per batch, the last batch may be smaller
+
+    Yields
+    ------
+    list
+        batch of records
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,175 @@
+import re
+
+import numpy as np
+
+import encoding
+import isbwt
+from collection import CollectionIndex, SegmentedCollection
+from fmindex import PRESETS, FMIndex
+
+
+def doubled(seq):
+    """
+    Concatenate a reference and its reverse complement, separated by an N
+    that no read base matches
+
+    Parameters
+    ----------
+    seq : str
+        reference sequence
+
+    Returns
+    -------
+    str
+        reference, separator and reverse complement
+    """
+    return seq + "N" + encoding.reverse_complement(seq)
+
+
+def reverse_cigar(cigar):
+    """
+    Reverse the operations of a CIGAR string
+
+    Parameters
+    ----------
+    cigar : str
+        CIGAR string
+
+    Returns
+    -------
+    str
+        CIGAR string of the reversed alignment
+    """
+    return "".join(reversed(re.findall(r"\d+[A-Z=]", cigar)))
+
+
+def from_arrays(alphabet, occ_rate, sa_rate, arrays, forward_length=None):
+    """
+    Wrap existing index arrays, as a StrandedIndex when the forward length
+    is known, as a CollectionIndex when they describe several sequences and
+    as a SegmentedCollection when they hold several segments
+
+    Parameters
+    ----------
+    alphabet : str
+        character of each code
+    occ_rate : int
+        distance between two occurrence checkpoints
+    sa_rate : int
+        distance between two sampled text positions
+    arrays : dict
+        index arrays, by name as listed in fmindex.ARRAYS
+    forward_length : int, optional
+        length of the reference of a StrandedIndex
+
+    Returns
+    -------
+    FMIndex, StrandedIndex, CollectionIndex or SegmentedCollection
+        index over the given arrays
+    """
+    if "segment0.seq_starts" in arrays:
+        return SegmentedCollection.from_arrays(alphabet, occ_rate, sa_rate, arrays)
+    if "seq_starts" in arrays:
+        return CollectionIndex.from_arrays(alphabet, occ_rate, sa_rate, arrays)
+    if forward_length is None:
+        return FMIndex.from_arrays(alphabet, occ_rate, sa_rate, arrays)
+    index = StrandedIndex.from_arrays(alphabet, occ_rate, sa_rate, arrays)
+    index.forward_length = forward_length
+    return index
+
+
+class StrandedIndex(FMIndex):
+    """
+    FM-index of a reference followed by its reverse complement
+
+    A single backward search of a read finds its occurrences on both
+    strands: hits in the second half are reverse strand hits, mapped back to
+    forward coordinates by orient().
+
+    Attributes
+    ----------
+    forward_length : int
+        length of the reference
+
+    Methods
+    -------
+    from_sequence(seq, preset)
+        build the index of a reference and its reverse complement
+    orient(positions, length)
+        forward positions and strands of hits on the doubled reference
+    locate_stranded(pattern)
+        positions and strands of the pattern in the reference
+    """
+
+    @classmethod
+    def from_sequence(cls, seq, preset="balanced"):
+        """
+        Build the index of a reference and its reverse complement
+
+        Parameters
+        ----------
+        seq : str
+            reference sequence
+        preset : str
+            sampling rates and rank structure, one of PRESETS
+
+        Returns
+        -------
+        StrandedIndex
+            index of both strands
+        """
+        b = isbwt.isbwt(doubled(seq))
+        b.transform()
+        occ_rate, sa_rate, rank = PRESETS[preset]
+        index = cls(b.transformed, b.SA, occ_rate, sa_rate, b.alphabet, rank)
+        index.forward_length = len(seq)
+        return index
+
+    def orient(self, positions, length):
+        """
+        Map hits on the doubled reference back to forward coordinates
+
+        Parameters
+        ----------
+        positions : np.array
+            start positions on the doubled reference
+        length : int or np.array
+            length of the hits on the reference, or of each hit
+
+        Returns
+        -------
+        np.array
+            start positions on the forward strand
+        np.array
+            strand of each hit, "+" or "-"
+        np.array
+            boolean mask of the hits kept, those spanning the separator being
+            dropped
+        """
+        n = self.forward_length
+        positions = np.asarray(positions, dtype=np.int64)
+        forward = positions + length <= n
+        reverse = positions > n
+        oriented = np.where(reverse, 2 * n + 1 - positions - length, positions)
+        strands = np.where(reverse, "-", "+")
+        keep = forward | reverse
+        return oriented[keep], strands[keep], keep
+
+    def locate_stranded(self, pattern):
+        """
+        Locate the pattern on both strands with a single backward search
+
+        Parameters
+        ----------
+        pattern : str
+            pattern to locate
+
+        Returns
+        -------
+        np.array
+            start positions on the forward strand
+        np.array
+            strand of each hit
+        """
+        positions, strands, _ = self.orient(self.locate(pattern), len(pattern))
+        return positions, strands
@@ -0,0 +1,23 @@
+import pytest
+
+import bwt
+import bwts
+import isbwt
+import sabwt
+from fmindex import FMIndex
+
+
+@pytest.mark.parametrize("seq", ["acgtacgt", "gattaca", "GATtaca", "GATTACA"])
+@pytest.mark.parametrize("f", [bwt.bwt, sabwt.sabwt, bwts.bwts])
+def test_inverse_keeps_case(f, seq):
+    b = f(seq)
+    b.transform()
+    assert b.inverse() == seq
+
+
+def test_index_keeps_case():
+    lower = FMIndex.from_transform(isbwt.isbwt("gattaca"))
+    assert lower.count("tta") == 1
+    assert lower.count("TTA") == 0
+    upper = FMIndex.from_transform(isbwt.isbwt("GATTACA"))
+    assert upper.count("TTA") == 1
@@ -0,0 +1,340 @@
+import numpy as np
+
+# 64-bit words summarised by each rank block, 512 bits fitting a cache line
+WORDS_PER_BLOCK = 8
+
+# popcount of every byte, for NumPy versions without np.bitwise_count
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """
+    Count the set bits of each 64-bit word
+
+    Parameters
+    ----------
+    words : np.array
+        np.uint64 words
+
+    Returns
+    -------
+    np.array
+        number of set bits of each word
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    bytes_ = np.ascontiguousarray(words).view(np.uint8).reshape(-1, 8)
+    return _POPCOUNT8[bytes_].sum(axis=1)
+
+
+def pack_bits(bits):
+    """
+    Pack a boolean array into 64-bit words, bit i being bit i % 64 of word
+    i // 64, with a spare word so that rank(n) never reads past the end
+
+    Parameters
+    ----------
+    bits : np.array
+        boolean array
+
+    Returns
+    -------
+    np.array
+        np.uint64 words
+    """
+    packed = np.packbits(bits, bitorder="little")
+    words = np.zeros(len(bits) // 64 + 1, dtype=np.uint64)
+    words.view(np.uint8)[: len(packed)] = packed
+    return words
+
+
+def rank_blocks(words):
+    """
+    Count the set bits preceding every block of WORDS_PER_BLOCK words
+
+    Parameters
+    ----------
+    words : np.array
+        np.uint64 words
+
+    Returns
+    -------
+    np.array
+        cumulative popcount before each block, as np.uint32
+    """
+    counts = popcount(words).astype(np.uint32)
+    starts = np.arange(0, len(words), WORDS_PER_BLOCK)
+    blocks = np.zeros(len(starts) + 1, dtype=np.uint32)
+    np.cumsum(np.add.reduceat(counts, starts, dtype=np.uint32), out=blocks[1:])
+    return blocks
+
+
+def rank1(words, blocks, i):
+    """
+    Number of set bits in the first i bits of a bitvector
+
+    Parameters
+    ----------
+    words : np.array
+        np.uint64 words of the bitvector
+    blocks : np.array
+        rank blocks of the bitvector
+    i : int
+        prefix length
+
+    Returns
+    -------
+    int
+        rank of 1 at position i
+    """
+    w = i >> 6
+    b = w // WORDS_PER_BLOCK
+    r = int(blocks[b])
+    for word in words[b * WORDS_PER_BLOCK : w].tolist():
+        r += word.bit_count()
+    return r + (int(words[w]) & ((1 << (i & 63)) - 1)).bit_count()
+
+
+def rank1_batch(words, blocks, i):
+    """
+    Number of set bits in the first i bits of a bitvector, for many
+    prefix lengths at once
+
+    Parameters
+    ----------
+    words : np.array
+        np.uint64 words of the bitvector
+    blocks : np.array
+        rank blocks of the bitvector
+    i : np.array
+        prefix lengths
+
+    Returns
+    -------
+    np.array
+        rank of 1 at each position, as np.int64
+    """
+    i = np.asarray(i, dtype=np.int64)
+    w = i >> 6
+    b = w // WORDS_PER_BLOCK
+    # whole words between the block start and word w, masked past w
+    window = b[:, None] * WORDS_PER_BLOCK + np.arange(WORDS_PER_BLOCK)
+    inside = window < w[:, None]
+    whole = popcount(words[np.minimum(window, len(words) - 1)]) * inside
+    mask = (np.uint64(1) << (i & 63).astype(np.uint64)) - np.uint64(1)
+    partial = popcount(words[w] & mask)
+    return blocks[b].astype(np.int64) + whole.sum(axis=1) + partial
+
+
+class WaveletMatrix:
+    """
+    Wavelet tree in levelwise layout (wavelet matrix) over integer codes
+
+    Level d holds bit d of every code, most significant first, codes being
+    stably partitioned by that bit (zeros first) before the next level.
+    Ranks take one bitvector rank per level, O(log sigma) in total, whatever
+    the alphabet size.
+
+    Parameters
+    ----------
+    codes : np.array
+        integer codes
+    sigma : int
+        alphabet size, all codes being lower than sigma
+
+    Attributes
+    ----------
+    words : np.array
+        (levels, n // 64 + 1) bitvector words of each level
+    blocks : np.array
+        rank blocks of each level
+    zeros : np.array
+        number of zeros of each level
+
+    Methods
+    -------
+    from_arrays(words, blocks, zeros)
+        wrap existing arrays
+    arrays()
+        arrays holding the wavelet matrix
+    access(i)
+        code at position i
+    access_batch(i)
+        codes at many positions at once
+    rank(c, i)
+        number of occurrences of code c in the first i codes
+    rank_batch(c, i)
+        ranks of many codes and prefix lengths at once
+    """
+
+    def __init__(self, codes, sigma):
+        levels = max(1, int(sigma - 1).bit_length())
+        n = len(codes)
+        self.words = np.zeros((levels, n // 64 + 1), dtype=np.uint64)
+        self.zeros = np.zeros(levels, dtype=np.int64)
+        blocks = []
+        current = np.asarray(codes)
+        for d in range(levels):
+            bits = ((current >> (levels - 1 - d)) & 1).astype(bool)
+            self.words[d] = pack_bits(bits)
+            blocks.append(rank_blocks(self.words[d]))
+            self.zeros[d] = n - np.count_nonzero(bits)
+            current = np.concatenate([current[~bits], current[bits]])
+        self.blocks = np.stack(blocks)
+
+    @classmethod
+    def from_arrays(cls, words, blocks, zeros):
+        """
+        Wrap existing wavelet matrix arrays without copying them
+
+        Parameters
+        ----------
+        words : np.array
+            bitvector words of each level
+        blocks : np.array
+            rank blocks of each level
+        zeros : np.array
+            number of zeros of each level
+
+        Returns
+        -------
+        WaveletMatrix
+            wavelet matrix over the given arrays
+        """
+        wm = cls.__new__(cls)
+        wm.words, wm.blocks, wm.zeros = words, blocks, zeros
+        return wm
+
+    def arrays(self):
+        """
+        Arrays holding the wavelet matrix
+
+        Returns
+        -------
+        dict
+            arrays, by name
+        """
+        return {
+            "wm_words": self.words,
+            "wm_blocks": self.blocks,
+            "wm_zeros": self.zeros,
+        }
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes + self.blocks.nbytes + self.zeros.nbytes
+
+    def __len__(self):
+        # every code has a bit on the first level, zero or one
+        return int(self.zeros[0]) + int(self.blocks[0, -1])
+
+    def access(self, i):
+        """
+        Code at a position, one bit per level following it down
+
+        Parameters
+        ----------
+        i : int
+            position
+
+        Returns
+        -------
+        int
+            code at position i
+        """
+        c = 0
+        for d in range(len(self.zeros)):
+            words, blocks = self.words[d], self.blocks[d]
+            bit = (int(words[i >> 6]) >> (i & 63)) & 1
+            c = c << 1 | bit
+            if bit:
+                i = int(self.zeros[d]) + rank1(words, blocks, i)
+            else:
+                i -= rank1(words, blocks, i)
+        return c
+
+    def access_batch(self, i):
+        """
+        Codes at many positions, every position going down the levels in
+        lockstep
+
+        Parameters
+        ----------
+        i : np.array
+            positions
+
+        Returns
+        -------
+        np.array
+            code at each position, as np.int64
+        """
+        i = np.asarray(i, dtype=np.int64)
+        c = np.zeros(len(i), dtype=np.int64)
+        for d in range(len(self.zeros)):
+            words, blocks = self.words[d], self.blocks[d]
+            shift = (i & 63).astype(np.uint64)
+            bit = ((words[i >> 6] >> shift) & np.uint64(1)).astype(np.int64)
+            c = c << 1 | bit
+            ones = rank1_batch(words, blocks, i).astype(np.int64)
+            i = np.where(bit == 1, int(self.zeros[d]) + ones, i - ones)
+        return c
+
+    def rank(self, c, i):
+        """
+        Number of occurrences of code c in the first i codes
+
+        Parameters
+        ----------
+        c : int
+            code
+        i : int
+            prefix length
+
+        Returns
+        -------
+        int
+            rank of c at position i
+        """
+        levels = len(self.zeros)
+        lo, hi = 0, i
+        for d in range(levels):
+            words, blocks = self.words[d], self.blocks[d]
+            if (c >> (levels - 1 - d)) & 1:
+                zeros = int(self.zeros[d])
+                lo = zeros + rank1(words, blocks, lo)
+                hi = zeros + rank1(words, blocks, hi)
+            else:
+                lo -= rank1(words, blocks, lo)
+                hi -= rank1(words, blocks, hi)
+        return hi - lo
+
+    def rank_batch(self, c, i):
+        """
+        Number of occurrences of each code in the prefix of matching length,
+        every pair going down the levels in lockstep
+
+        Parameters
+        ----------
+        c : np.array
+            codes
+        i : np.array
+            prefix lengths
+
+        Returns
+        -------
+        np.array
+            rank of each code at its position, as np.int64
+        """
+        c = np.asarray(c, dtype=np.int64)
+        levels = len(self.zeros)
+        lo = np.zeros(len(c), dtype=np.int64)
+        hi = np.asarray(i, dtype=np.int64)
+        for d in range(levels):
+            words, blocks = self.words[d], self.blocks[d]
+            one = ((c >> (levels - 1 - d)) & 1).astype(bool)
+            rank_lo = rank1_batch(words, blocks, lo)
+            rank_hi = rank1_batch(words, blocks, hi)
+            zeros = int(self.zeros[d])
+            lo = np.where(one, zeros + rank_lo, lo - rank_lo)
+            hi = np.where(one, zeros + rank_hi, hi - rank_hi)
+        return hi - lo